@@ -0,0 +1,84 @@
+"""Per-user read/write locking for the shared recommendation engine.
+
+Every endpoint calls into one engine instance from the Starlette threadpool.
+Requests for different users never wait for each other. For the same user,
+reads (size, outfit, recommendations, insights) run side by side while
+writes (register, purchases) get the user to themselves.
+
+Users are hashed onto a fixed number of lock stripes, so memory stays
+bounded however many users there are. Two users sharing a stripe only
+contend when one of them is writing.
+"""
+import threading
+import zlib
+from contextlib import ExitStack, contextmanager
+from typing import Iterator, List
+
+DEFAULT_STRIPES = 64
+
+
+class ReadWriteLock:
+    """Many readers or one writer; waiting writers go before new readers"""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class StripedLocks:
+    """A fixed pool of read/write locks, picked by a stable hash of the key"""
+
+    def __init__(self, stripes: int = DEFAULT_STRIPES) -> None:
+        self._locks: List[ReadWriteLock] = [ReadWriteLock() for _ in range(max(1, stripes))]
+
+    def for_key(self, key: str) -> ReadWriteLock:
+        return self._locks[zlib.crc32(str(key).encode("utf-8")) % len(self._locks)]
+
+    def read(self, key: str):
+        """Shared access to one user's state (not reentrant)"""
+        return self.for_key(key).read()
+
+    def write(self, key: str):
+        """Exclusive access to one user's state (not reentrant)"""
+        return self.for_key(key).write()
+
+    @contextmanager
+    def write_all(self) -> Iterator[None]:
+        """Exclusive access to every user, for changes that replace users wholesale"""
+        with ExitStack() as stack:
+            for lock in self._locks:  # Always in the same order
+                stack.enter_context(lock.write())
+            yield
@@ -1,13 +1,24 @@
+import hashlib
+import hmac
+import logging
 import os
 import pickle
 import re
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, RootModel
 
+from concurrency import DEFAULT_STRIPES, StripedLocks
+from response_cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL_SECONDS, ResponseCache
+from user_store import DEFAULT_SNAPSHOT_EVERY, UserStore
+
 APP_TITLE = "FitFast Fashion AI Service"
 APP_DESCRIPTION = (
     "Lightweight FastAPI wrapper that exposes the notebook-generated "
@@ -19,6 +30,32 @@ _FALLBACK_MODEL_PATHS = [
     DEFAULT_MODEL_PATH,
     _SERVICE_ROOT.parent / "frontend" / "src" / "ai" / "artifacts" / "fashion_api.pkl",
 ]
+DEFAULT_STATE_DIR = _SERVICE_ROOT / "state"
+
+# Start-up behaviour, see _startup_load()
+WARMUP_USER_ID = "__warmup__"
+WARMUP_MEASUREMENTS = {
+    "chest_circumference": 96.0,
+    "waist_circumference": 82.0,
+    "hips_circumference": 98.0,
+    "shoulder_width": 45.0,
+    "inseam_length": 80.0,
+}
+
+# Upper bound on the number of entries in one /api/batch/* request
+MAX_BATCH_SIZE = int(os.getenv("FASHION_AI_MAX_BATCH", "500"))
+
+# Every engine response names the model version that produced it
+MODEL_VERSION_HEADER = "X-Model-Version"
+
+logger = logging.getLogger("fitfast.ai_service")
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off", "")
 
 
 class UserMeasurements(RootModel[Any]):
@@ -114,7 +151,50 @@ class PurchasePayload(BaseModel):
     price: Optional[float] = None
 
 
-app = FastAPI(title=APP_TITLE, description=APP_DESCRIPTION)
+class BatchSizeItem(SizeRequest):
+    user_id: str = Field(..., alias="userId")
+
+
+class BatchOutfitItem(OutfitRequest):
+    user_id: str = Field(..., alias="userId")
+
+
+class BatchRecommendationItem(RecommendationRequest):
+    user_id: str = Field(..., alias="userId")
+
+    class Config:
+        populate_by_name = True
+
+
+class BatchSizeRequest(BaseModel):
+    requests: List[BatchSizeItem] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class BatchOutfitRequest(BaseModel):
+    requests: List[BatchOutfitItem] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class BatchRecommendationRequest(BaseModel):
+    requests: List[BatchRecommendationItem] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    # Load in the background so liveness answers while the model loads
+    if _env_flag("FASHION_AI_EAGER_LOAD", True):
+        threading.Thread(target=_startup_load, name="model-startup", daemon=True).start()
+    interval = float(os.getenv("FASHION_AI_RELOAD_INTERVAL", "30"))
+    if interval > 0 and _reload_handler is None:
+        threading.Thread(target=_watch_model_file, args=(interval,), name="model-watch", daemon=True).start()
+    state_interval = float(os.getenv("FASHION_AI_STATE_INTERVAL", "10"))
+    if _user_store is not None and state_interval > 0:
+        threading.Thread(target=_follow_user_store, args=(state_interval,), name="user-follow", daemon=True).start()
+    yield
+    if _user_store is not None:
+        _user_store.close()
+
+
+app = FastAPI(title=APP_TITLE, description=APP_DESCRIPTION, lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -122,7 +202,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-_api_instance: Any = None
+class LoadedModel(NamedTuple):
+    """One loaded engine, swapped in and out as a unit"""
+
+    api: Any
+    version: str  # content hash of the model file
+    path: str
+    generation: int  # response-cache catalog version of this engine
+
+
+_model: Optional[LoadedModel] = None
+# Reads of one user run in parallel, writes (register, purchases) are exclusive
+_user_locks = StripedLocks(int(os.getenv("FASHION_AI_LOCK_STRIPES", DEFAULT_STRIPES)))
+# Read endpoint responses, invalidated by user writes and model loads
+_response_cache = ResponseCache(
+    max_entries=int(os.getenv("FASHION_AI_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+    ttl_seconds=float(os.getenv("FASHION_AI_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+)
+
+def _engine_users() -> Optional[Dict[str, Any]]:
+    users = getattr(_model.api, "users", None) if _model is not None else None
+    return users if isinstance(users, dict) else None
+
+
+# Registrations and purchases survive restarts; FASHION_AI_STATE_DIR="" turns this off
+_state_dir = os.getenv("FASHION_AI_STATE_DIR", str(DEFAULT_STATE_DIR))
+_user_store: Optional[UserStore] = UserStore(
+    _state_dir,
+    users=_engine_users,
+    snapshot_every=int(os.getenv("FASHION_AI_SNAPSHOT_EVERY", DEFAULT_SNAPSHOT_EVERY)),
+    fsync=_env_flag("FASHION_AI_STATE_FSYNC", False),
+) if _state_dir else None
+_api_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_warmup_pending = False
+# Set by serve_prefork: workers hand reloads to the parent instead of loading a private copy
+_reload_handler: Optional[Callable[[], None]] = None
+_api_state: Dict[str, Any] = {
+    "status": "cold",  # cold -> loading -> warming -> ready, or failed / degraded (warm-up all failed)
+    "error": None,
+    "load_ms": None,
+    "warmup_ms": None,
+    "warmup": None,
+    "model_version": None,
+    "model_path": None,
+    "loaded_at": None,
+    "reload_status": "idle",  # idle, reloading or failed; the running model is kept on failure
+    "reload_error": None,
+    "restore": None,
+}
 
 
 def _resolve_model_path() -> Path:
@@ -148,98 +276,542 @@ def _resolve_model_path() -> Path:
     )
 
 
+class _HashingReader:
+    """File wrapper that hashes everything read through it"""
+
+    def __init__(self, handle: Any) -> None:
+        self._handle = handle
+        self.digest = hashlib.sha256()
+        self.peek = handle.peek
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._handle.read(size)
+        self.digest.update(data)
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        data = self._handle.readline(size)
+        self.digest.update(data)
+        return data
+
+
+def _load_engine(model_path: Path) -> Tuple[Any, str]:
+    """Unpickle the engine and hash the file in the same pass"""
+    with model_path.open("rb") as handle:
+        reader = _HashingReader(handle)
+        api = pickle.load(reader)
+        while reader.read(1 << 20):
+            pass
+    return api, reader.digest.hexdigest()[:12]
+
+
+def _install(api: Any, version: str, model_path: Path) -> LoadedModel:
+    """Make api the engine new requests get; callers hold _api_lock"""
+    global _model
+    model = LoadedModel(api, version, str(model_path), _response_cache.bump_catalog())
+    _model = model
+    _api_state.update(
+        model_version=version,
+        model_path=str(model_path),
+        loaded_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    )
+    return model
+
+
+def get_model() -> LoadedModel:
+    """The active engine, loaded once; concurrent first callers wait for a single load"""
+    model = _model
+    if model is not None:
+        return model
+
+    with _api_lock:
+        if _model is None:
+            _api_state.update(status="loading", error=None)
+            start = time.perf_counter()
+            try:
+                model_path = _resolve_model_path()
+                api, version = _load_engine(model_path)
+                if _user_store is not None:
+                    _api_state["restore"] = _restore_users(api)
+            except Exception as exc:
+                _api_state.update(status="failed", error=str(exc))
+                if isinstance(exc, FileNotFoundError):
+                    raise
+                raise RuntimeError(f"Failed to load Fashion API: {exc}")
+
+            _api_state["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            if _warmup_pending:
+                # Before _install: no request can reach the users dict the warm-up writes to
+                _api_state["status"] = "warming"
+                start = time.perf_counter()
+                _api_state["warmup"] = _warm_up(api)
+                _api_state["warmup_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            _install(api, version, model_path)
+            if _warmup_pending and _warm_up_failed(_api_state["warmup"]):
+                # Real requests would hit the same errors; keep traffic away
+                _api_state.update(status="degraded", error="Every warm-up call failed")
+                logger.error("Every warm-up call failed, reporting not ready: %s", _api_state["warmup"])
+            else:
+                _api_state["status"] = "ready"
+        return _model
+
+
 def get_api() -> Any:
-    global _api_instance
-    if _api_instance is None:
-        model_path = _resolve_model_path()
+    return get_model().api
+
+
+def _apply_logged_write(api: Any, entry: Dict[str, Any]) -> None:
+    """Replay one user-store log entry against the engine"""
+    if entry["op"] == "register":
+        api.register(entry["payload"])
+    elif entry["op"] == "purchase":
+        api.add_purchase(
+            user_id=entry["user_id"],
+            item_id=entry["item_id"],
+            item_name=entry["item_name"],
+            price=entry["price"],
+        )
+    else:
+        raise ValueError(f"Unknown operation '{entry['op']}'")
+
+
+def _restore_users(api: Any) -> Dict[str, Any]:
+    """Bring api's users up to date with the user store (the first call restores everything)"""
+    users = getattr(api, "users", None)
+    return _user_store.restore(
+        users if isinstance(users, dict) else None,
+        lambda entry: _apply_logged_write(api, entry),
+    )
+
+
+def _logged_user(entry: Dict[str, Any]) -> str:
+    return entry["payload"]["user_id"] if entry["op"] == "register" else entry["user_id"]
+
+
+def _apply_other_process_write(entry: Dict[str, Any]) -> None:
+    """Apply a write another process logged, like a request of this one would"""
+    user_id = _logged_user(entry)
+    with _user_locks.write(user_id), _recording():
+        _apply_logged_write(_model.api, entry)
+        _response_cache.bump_user(user_id)
+
+
+def _resync_users() -> None:
+    """Load the latest snapshot and the log after it while no request touches a user"""
+    with _user_locks.write_all():
+        report = _restore_users(_model.api)
+        _response_cache.clear()
+    logger.warning("Another process snapshotted user writes this one had not applied; reloaded %d users",
+                   report["snapshot_users"])
+
+
+def _follow_user_store(interval: float) -> None:
+    """Apply the user writes other workers log; runs for the life of the process"""
+    while True:
+        time.sleep(interval)
+        if _model is None:
+            continue
         try:
-            with model_path.open("rb") as handle:
-                _api_instance = pickle.load(handle)
-        except Exception as exc:  # pragma: no cover - defensive only
-            raise RuntimeError(f"Failed to load Fashion API from {model_path}: {exc}")
-    return _api_instance
+            if _user_store.catch_up(_apply_other_process_write) is None:
+                # Another process snapshotted entries this one never applied. serve_prefork
+                # re-forks its workers after each snapshot instead (snapshots is off there).
+                if _user_store.snapshots:
+                    _resync_users()
+            elif _user_store.snapshot_due:
+                _user_store.snapshot()
+        except Exception as exc:
+            logger.error("Could not catch up on other workers' user writes: %s", exc)
+
+
+def _recording() -> Any:
+    """Hold around a user write and its _persist() call"""
+    return _user_store.recording() if _user_store is not None else nullcontext()
+
+
+def _persist(op: str, **fields: Any) -> None:
+    if _user_store is not None:
+        _user_store.append(op, **fields)
+
+
+def _warm_up(api: Any) -> Dict[str, Any]:
+    """
+    Run one size, outfit and recommendation call before taking traffic
+
+    Uses FASHION_AI_WARMUP_USER when set. Otherwise a throwaway user is
+    registered and removed again afterwards. Failures are reported, not
+    raised: a slow first call is better than a worker that never starts.
+    """
+    user_id = os.getenv("FASHION_AI_WARMUP_USER")
+    temporary = not user_id
+    user_id = user_id or WARMUP_USER_ID
+    garment_type = os.getenv("FASHION_AI_WARMUP_GARMENT", "t_shirt")
+
+    calls = []
+    if temporary:
+        calls.append(("register", lambda: api.register({
+            "user_id": user_id, "name": "", "email": "",
+            "measurements": dict(WARMUP_MEASUREMENTS), "preferences": None,
+            "purchase_history": [], "wishlist": [], "view_history": [],
+        })))
+    calls += [
+        ("get_size", lambda: api.get_size(user_id, garment_type, None)),
+        ("build_outfit", lambda: api.build_outfit(user_id=user_id, starting_item_id=None, style=None)),
+        ("recommend", lambda: api.recommend(user_id, n=6)),
+    ]
+
+    report: Dict[str, Any] = {}
+    for name, call in calls:
+        start = time.perf_counter()
+        try:
+            call()
+            report[name] = {"ok": True}
+        except Exception as exc:
+            report[name] = {"ok": False, "error": str(exc)}
+            logger.warning("Warm-up call %s failed: %s", name, exc)
+        report[name]["ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    users = getattr(api, "users", None)
+    if temporary and isinstance(users, dict):
+        users.pop(user_id, None)
+    return report
+
+
+def _warm_up_failed(report: Dict[str, Any]) -> bool:
+    """True when there were warm-up calls and none of them succeeded"""
+    return bool(report) and not any(call["ok"] for call in report.values())
+
+
+def _startup_load() -> None:
+    """Load the engine and warm it up; readiness flips once both are done"""
+    global _warmup_pending
+    _warmup_pending = _env_flag("FASHION_AI_WARMUP", True)
+
+    try:
+        get_model()  # Warms up too while _warmup_pending is set
+    except Exception as exc:
+        logger.error("Model load failed: %s", exc)
+    finally:
+        _warmup_pending = False
+
+
+def _carry_over_users(old_api: Any, new_api: Any) -> None:
+    """
+    Hand the users registered so far to the new engine
+
+    Both engines end up sharing one dict, so writes from requests still
+    finishing on the old engine are not lost.
+    """
+    old_users = getattr(old_api, "users", None)
+    new_users = getattr(new_api, "users", None)
+    if isinstance(old_users, dict) and isinstance(new_users, dict):
+        for user_id, profile in new_users.items():
+            old_users.setdefault(user_id, profile)
+        new_api.users = old_users
+
+
+def reload_model() -> bool:
+    """
+    Load the model file again and swap it in if its content changed
+
+    The new engine is loaded and warmed up beside the running one. Requests
+    that already hold the old engine finish on it, later ones get the new
+    one. On any failure the running engine stays. Returns True when a new
+    engine was swapped in.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        return False  # A reload is already running
+
+    try:
+        if _model is None:
+            get_model()
+            return True
+
+        _api_state.update(reload_status="reloading", reload_error=None)
+        start = time.perf_counter()
+        try:
+            model_path = _resolve_model_path()
+            api, version = _load_engine(model_path)
+        except Exception as exc:
+            _api_state.update(reload_status="failed", reload_error=str(exc))
+            logger.error("Model reload failed, keeping %s: %s", _model.version, exc)
+            return False
+
+        if version == _model.version:
+            _api_state["reload_status"] = "idle"
+            return False
+        load_ms = round((time.perf_counter() - start) * 1000, 1)
+
+        warmup, warmup_ms = None, None
+        # Separate from FASHION_AI_WARMUP, which pre-forked workers turn off
+        if _env_flag("FASHION_AI_RELOAD_WARMUP", True):
+            # Still on the new engine's own users dict, so the temporary
+            # warm-up user never appears in the live one
+            warmup_user = os.getenv("FASHION_AI_WARMUP_USER")
+            old_users, new_users = getattr(_model.api, "users", None), getattr(api, "users", None)
+            if warmup_user and isinstance(old_users, dict) and isinstance(new_users, dict) \
+                    and warmup_user in old_users:
+                new_users.setdefault(warmup_user, old_users[warmup_user])
+            start = time.perf_counter()
+            warmup = _warm_up(api)
+            warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+            if _warm_up_failed(warmup):
+                _api_state.update(reload_status="failed", reload_error="Every warm-up call failed")
+                logger.error("Model reload warm-up failed, keeping %s: %s", _model.version, warmup)
+                return False
+        _carry_over_users(_model.api, api)
+
+        with _api_lock:
+            previous = _model.version
+            _install(api, version, model_path)
+            _api_state.update(load_ms=load_ms, warmup=warmup, warmup_ms=warmup_ms, reload_status="idle")
+        logger.info("Model reloaded: %s -> %s (load %s ms, warm-up %s ms)", previous, version, load_ms, warmup_ms)
+        return True
+    finally:
+        _reload_lock.release()
+
+
+def _model_file_signature() -> Optional[Tuple[str, int, int]]:
+    try:
+        path = _resolve_model_path()
+        stat = path.stat()
+    except OSError:
+        return None
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+class ModelFileWatch:
+    """Tells, one check at a time, when the model file has changed"""
+
+    def __init__(self) -> None:
+        self.loaded = self.previous = _model_file_signature()
+
+    def changed(self) -> bool:
+        current = _model_file_signature()
+        # Unchanged for a whole interval, so a copy still in progress is never loaded
+        changed = current is not None and current != self.loaded and current == self.previous
+        if changed:
+            self.loaded = current
+        self.previous = current
+        return changed
+
+
+def _watch_model_file(interval: float) -> None:
+    """Reload after the model file changes; runs for the life of the process"""
+    watch = ModelFileWatch()
+    while True:
+        time.sleep(interval)
+        if watch.changed():
+            reload_model()
+
+
+def _with_version(response: Response, model: LoadedModel) -> LoadedModel:
+    response.headers[MODEL_VERSION_HEADER] = model.version
+    return model
+
+
+def _engine_error(model: LoadedModel, detail: str) -> HTTPException:
+    """A 500 that still names the model version; failures are what needs tracing to a model"""
+    return HTTPException(status_code=500, detail=detail, headers={MODEL_VERSION_HEADER: model.version})
 
 
 @app.post("/api/users")
-def register_user(payload: UserSyncPayload) -> Dict[str, Any]:
-    api = get_api()
+def register_user(payload: UserSyncPayload, response: Response) -> Dict[str, Any]:
+    model = _with_version(response, get_model())
     try:
-        profile = api.register(payload.to_engine_payload())
+        engine_payload = payload.to_engine_payload()
+        with _user_locks.write(payload.user_id), _recording():
+            try:
+                profile = model.api.register(engine_payload)
+                _persist("register", payload=engine_payload)
+            finally:
+                # Even when logging fails: the engine may already hold the write
+                _response_cache.bump_user(payload.user_id)
         return {"data": profile}
     except Exception as exc:  # pragma: no cover - delegated to notebook code
-        raise HTTPException(status_code=500, detail=f"Registration failed: {exc}")
+        raise _engine_error(model, f"Registration failed: {exc}")
 
 
-@app.post("/api/users/{user_id}/size")
-def size_recommendation(user_id: str, request: SizeRequest) -> Dict[str, Any]:
-    api = get_api()
-    try:
-        result = api.get_size(user_id, request.garment_type, request.item_id)
-        return {"data": result}
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Size recommendation failed: {exc}")
+def _size_result(model: LoadedModel, user_id: str, request: SizeRequest) -> Any:
+    with _user_locks.read(user_id):
+        return _response_cache.get_or_compute(
+            "size", user_id,
+            {"garment_type": request.garment_type, "item_id": request.item_id},
+            lambda: model.api.get_size(user_id, request.garment_type, request.item_id),
+            catalog_version=model.generation,
+        )
 
 
-@app.post("/api/users/{user_id}/outfit")
-def outfit_recommendation(user_id: str, request: OutfitRequest) -> Dict[str, Any]:
-    api = get_api()
-    try:
-        result = api.build_outfit(
+def _outfit_result(model: LoadedModel, user_id: str, request: OutfitRequest) -> Any:
+    def build() -> Any:
+        result = model.api.build_outfit(
             user_id=user_id,
             starting_item_id=request.starting_item_id,
             style=request.style,
         )
         if isinstance(result, dict):
             result.setdefault("max_items", request.max_items)
+        return result
+
+    with _user_locks.read(user_id):
+        return _response_cache.get_or_compute(
+            "outfit", user_id,
+            {"starting_item_id": request.starting_item_id, "style": request.style,
+             "max_items": request.max_items},
+            build,
+            catalog_version=model.generation,
+        )
+
+
+def _recommendations_result(model: LoadedModel, user_id: str, request: RecommendationRequest) -> Any:
+    with _user_locks.read(user_id):
+        return _response_cache.get_or_compute(
+            "recommendations", user_id, {"limit": request.limit},
+            lambda: model.api.recommend(user_id, n=request.limit),
+            catalog_version=model.generation,
+        )
+
+
+def _run_batch(items: List[Any], compute: Callable[[Any], Any]) -> Dict[str, Any]:
+    """One result per item, in order; a failing item reports its error instead of failing the batch"""
+    results = []
+    for item in items:
+        try:
+            results.append({"user_id": item.user_id, "data": compute(item)})
+        except Exception as exc:
+            results.append({"user_id": item.user_id, "error": str(exc)})
+    return {"data": results}
+
+
+@app.post("/api/users/{user_id}/size")
+def size_recommendation(user_id: str, request: SizeRequest, response: Response) -> Dict[str, Any]:
+    model = _with_version(response, get_model())
+    try:
+        result = _size_result(model, user_id, request)
+        return {"data": result}
+    except Exception as exc:
+        raise _engine_error(model, f"Size recommendation failed: {exc}")
+
+
+@app.post("/api/users/{user_id}/outfit")
+def outfit_recommendation(user_id: str, request: OutfitRequest, response: Response) -> Dict[str, Any]:
+    model = _with_version(response, get_model())
+    try:
+        result = _outfit_result(model, user_id, request)
         return {"data": result}
     except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Outfit recommendation failed: {exc}")
+        raise _engine_error(model, f"Outfit recommendation failed: {exc}")
 
 
 @app.post("/api/users/{user_id}/recommendations")
-def personalized_recommendations(user_id: str, request: RecommendationRequest) -> Dict[str, Any]:
-    api = get_api()
+def personalized_recommendations(user_id: str, request: RecommendationRequest, response: Response) -> Dict[str, Any]:
+    model = _with_version(response, get_model())
     try:
-        result = api.recommend(user_id, n=request.limit)
+        result = _recommendations_result(model, user_id, request)
         return {"data": result}
     except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Recommendation failed: {exc}")
+        raise _engine_error(model, f"Recommendation failed: {exc}")
 
 
 @app.post("/api/users/{user_id}/insights")
-def user_insights(user_id: str) -> Dict[str, Any]:
-    api = get_api()
+def user_insights(user_id: str, response: Response) -> Dict[str, Any]:
+    model = _with_version(response, get_model())
     try:
-        result = api.get_insights(user_id)
+        with _user_locks.read(user_id):
+            result = _response_cache.get_or_compute(
+                "insights", user_id, {}, lambda: model.api.get_insights(user_id),
+                catalog_version=model.generation,
+            )
         return {"data": result}
     except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Insights failed: {exc}")
+        raise _engine_error(model, f"Insights failed: {exc}")
 
 
 @app.post("/api/users/{user_id}/purchases")
-def add_purchase(user_id: str, purchase: PurchasePayload) -> Dict[str, Any]:
-    api = get_api()
+def add_purchase(user_id: str, purchase: PurchasePayload, response: Response) -> Dict[str, Any]:
+    model = _with_version(response, get_model())
     try:
-        result = api.add_purchase(
-            user_id=user_id,
-            item_id=purchase.item_id,
-            item_name=purchase.item_name or "",
-            price=purchase.price or 0.0,
-        )
+        record = {
+            "user_id": user_id,
+            "item_id": purchase.item_id,
+            "item_name": purchase.item_name or "",
+            "price": purchase.price or 0.0,
+        }
+        with _user_locks.write(user_id), _recording():
+            try:
+                result = model.api.add_purchase(**record)
+                _persist("purchase", **record)
+            finally:
+                # Even when logging fails: the engine may already hold the write
+                _response_cache.bump_user(user_id)
         return {"data": result}
     except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Purchase logging failed: {exc}")
+        raise _engine_error(model, f"Purchase logging failed: {exc}")
+
+
+@app.post("/api/batch/size")
+def batch_size_recommendation(batch: BatchSizeRequest, response: Response) -> Dict[str, Any]:
+    model = _with_version(response, get_model())
+    return _run_batch(batch.requests, lambda item: _size_result(model, item.user_id, item))
+
+
+@app.post("/api/batch/outfits")
+def batch_outfit_recommendation(batch: BatchOutfitRequest, response: Response) -> Dict[str, Any]:
+    model = _with_version(response, get_model())
+    return _run_batch(batch.requests, lambda item: _outfit_result(model, item.user_id, item))
+
+
+@app.post("/api/batch/recommendations")
+def batch_recommendations(batch: BatchRecommendationRequest, response: Response) -> Dict[str, Any]:
+    model = _with_version(response, get_model())
+    return _run_batch(batch.requests, lambda item: _recommendations_result(model, item.user_id, item))
+
+
+@app.post("/admin/reload", status_code=202)
+def admin_reload(x_admin_token: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """Reload the model file in the background; needs FASHION_AI_ADMIN_TOKEN"""
+    token = os.getenv("FASHION_AI_ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=403, detail="Set FASHION_AI_ADMIN_TOKEN to enable reloads")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    if _reload_handler is not None:
+        _reload_handler()
+    elif _reload_lock.locked():
+        raise HTTPException(status_code=409, detail="A reload is already running")
+    else:
+        threading.Thread(target=reload_model, name="model-reload", daemon=True).start()
+    return {"data": {"status": "reloading", "model_version": _api_state["model_version"]}}
 
 
 @app.get("/health")
 def healthcheck() -> Dict[str, Any]:
     try:
-        get_api()
-        return {"status": "ok"}
+        model = get_model()
+        return {"status": "ok", "model_version": model.version}
     except Exception as exc:  # pragma: no cover - sanity endpoint
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+@app.get("/health/live")
+def liveness() -> Dict[str, Any]:
+    """The process is up; says nothing about the model"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+def readiness() -> JSONResponse:
+    """200 once the model is loaded and warmed up, 503 before that"""
+    state = dict(_api_state)
+    ready = _model is not None and state["status"] == "ready"
+    return JSONResponse(status_code=200 if ready else 503, content=state)
+
+
+@app.get("/cache/stats")
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the response cache"""
+    return _response_cache.stats()
+
+
 if __name__ == "__main__":  # pragma: no cover - manual launch helper
     import uvicorn
 
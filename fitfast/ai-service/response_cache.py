@@ -0,0 +1,136 @@
+"""In-process LRU + TTL cache for read endpoint responses.
+
+Keys are (endpoint, user, request parameters, user version, catalog
+version). A user's version is bumped whenever their state changes
+(profile sync, purchases), and the catalog version whenever the model is
+(re)loaded. Entries from before a bump can then never be served again; they
+age out through the LRU or their TTL instead of being searched for.
+
+Versions are read before the response is computed. A write that lands
+while a response is being computed therefore leaves that response stored
+under the old version, where it is never read.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL_SECONDS = 30.0
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._user_versions: Dict[str, int] = {}
+        self.catalog_version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def user_version(self, user_id: str) -> int:
+        return self._user_versions.get(user_id, 0)
+
+    def bump_user(self, user_id: str) -> None:
+        """Invalidate every cached response for one user"""
+        with self._lock:
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        """Drop every cached response, for user changes too broad to bump one by one"""
+        with self._lock:
+            self._entries.clear()
+
+    def bump_catalog(self) -> int:
+        """Invalidate every cached response (new model or catalog); returns the new version"""
+        with self._lock:
+            self.catalog_version += 1
+            self._entries.clear()
+            return self.catalog_version
+
+    def key(
+        self, endpoint: str, user_id: str, params: Dict[str, Any], catalog_version: Optional[int] = None
+    ) -> Hashable:
+        return (
+            endpoint,
+            user_id,
+            json.dumps(params, sort_keys=True, default=str),
+            self.user_version(user_id),
+            self.catalog_version if catalog_version is None else catalog_version,
+        )
+
+    def get_or_compute(
+        self,
+        endpoint: str,
+        user_id: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Any],
+        catalog_version: Optional[int] = None,
+    ) -> Any:
+        """
+        The cached response, or compute() stored for next time; errors are not cached
+
+        Pass the catalog version the caller's engine was loaded under, so a
+        request still running on a replaced engine never stores its answer
+        under the new version.
+        """
+        if not self.enabled:
+            return compute()
+
+        key = self.key(endpoint, user_id, params, catalog_version)
+        now = self._clock()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            # A catalog bump while computing makes this result stale already
+            if key[-1] == self.catalog_version:
+                self._entries[key] = (self._clock() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "catalog_version": self.catalog_version,
+            }
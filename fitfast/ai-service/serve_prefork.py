@@ -0,0 +1,311 @@
+"""Pre-forked multi-worker server for the AI service.
+
+    python serve_prefork.py --workers 4 --port 8001
+
+The parent process loads and warms up the engine once, then moves
+everything allocated so far into the GC's permanent generation
+(gc.freeze). Only then does it fork the workers. Workers inherit the model
+as copy-on-write pages, and because those objects are frozen, collections
+in the workers no longer write to them (and so never copy their pages).
+The parent does not serve requests. It restarts workers that exit and
+logs each worker's unique and shared memory every --report-interval
+seconds.
+
+Model reloads also happen once, in the parent. It watches the model file
+(FASHION_AI_RELOAD_INTERVAL) and takes SIGHUP, which is what a worker's
+POST /admin/reload sends. A changed model is loaded, warmed up and frozen
+in the parent. Registered users are caught up from the user store, then a
+fresh set of workers is forked and the old ones are stopped gracefully.
+Workers never run a watcher of their own, so a reload cannot leave every
+worker holding a private copy of the model.
+
+User writes (see user_store.py) are logged by whichever worker takes
+them, and every FASHION_AI_STATE_INTERVAL seconds each worker applies the
+ones the others logged. A user registered on one worker is therefore
+known to the rest within that interval. Every --state-interval seconds
+the parent does the same to its own users and snapshots them when
+FASHION_AI_SNAPSHOT_EVERY writes have piled up; workers never snapshot.
+A snapshot cuts the log entries it covers, which workers may not have
+applied yet, so the parent re-forks the workers after each one, as after
+a reload.
+
+Needs os.fork (Linux/macOS). Memory figures come from
+/proc/<pid>/smaps_rollup, so they are only reported on Linux.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+import main
+
+logger = logging.getLogger("fitfast.ai_service.prefork")
+
+
+def read_memory(pid: int) -> Optional[Dict[str, float]]:
+    """Unique (private) and shared resident memory of a process in MB"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as handle:
+            lines = handle.readlines()
+    except OSError:
+        return None
+
+    kb: Dict[str, int] = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+            kb[parts[0][:-1]] = int(parts[1])
+
+    return {
+        "rss_mb": round(kb.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(kb.get("Pss", 0) / 1024, 1),
+        "unique_mb": round((kb.get("Private_Clean", 0) + kb.get("Private_Dirty", 0)) / 1024, 1),
+        "shared_mb": round((kb.get("Shared_Clean", 0) + kb.get("Shared_Dirty", 0)) / 1024, 1),
+    }
+
+
+def memory_report(parent_pid: int, worker_pids: List[int]) -> Dict[str, object]:
+    """Per-process memory plus the total a node has to budget for"""
+    processes = []
+    for role, pid in [("parent", parent_pid)] + [("worker", pid) for pid in worker_pids]:
+        usage = read_memory(pid)
+        if usage is not None:
+            processes.append({"role": role, "pid": pid, **usage})
+
+    return {
+        "processes": processes,
+        # PSS splits shared pages between the processes mapping them
+        "total_pss_mb": round(sum(p["pss_mb"] for p in processes), 1),
+    }
+
+
+def _log_memory(parent_pid: int, worker_pids: List[int]) -> None:
+    report = memory_report(parent_pid, worker_pids)
+    for entry in report["processes"]:
+        logger.info(
+            "%-6s pid=%-7d rss=%8.1f MB  unique=%8.1f MB  shared=%8.1f MB  pss=%8.1f MB",
+            entry["role"], entry["pid"], entry["rss_mb"], entry["unique_mb"],
+            entry["shared_mb"], entry["pss_mb"],
+        )
+    if report["processes"]:
+        logger.info("total pss=%.1f MB", report["total_pss_mb"])
+
+
+def _serve_worker(sock: socket.socket, args: argparse.Namespace) -> None:
+    """Child process: run one uvicorn server on the inherited socket"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if main._user_store is not None:
+        main._user_store.snapshots = False  # The parent has every worker's writes, a worker only its own
+
+    config = uvicorn.Config(main.app, log_level=args.log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _ask_parent_to_reload() -> None:
+    """main._reload_handler in the workers"""
+    os.kill(os.getppid(), signal.SIGHUP)
+
+
+def _catch_up_users() -> bool:
+    """Apply the workers' logged writes to the parent's users, then snapshot when due"""
+    store = main._user_store
+    if store is None:
+        return False
+    try:
+        main._restore_users(main._model.api)
+        if store.snapshot_due:
+            return store.snapshot()
+    except Exception as exc:
+        logger.error("Could not catch up on user writes: %s", exc)
+    return False
+
+
+def _reload() -> bool:
+    """Swap in a changed model in the parent; True when workers need re-forking"""
+    gc.unfreeze()  # Lets the old model be collected once it is replaced
+    try:
+        if not main.reload_model():
+            return False
+        # Writes the old workers made since start-up, so the new ones start with them
+        _catch_up_users()
+        logger.info("Model %s loaded, replacing workers", main._model.version)
+        return True
+    finally:
+        gc.collect()
+        gc.freeze()
+
+
+def _spawn(sock: socket.socket, args: argparse.Namespace) -> int:
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            _serve_worker(sock, args)
+        except BaseException:  # pragma: no cover - logged by uvicorn
+            status = 1
+        finally:
+            os._exit(status)
+    return pid
+
+
+def serve(args: argparse.Namespace) -> int:
+    if not hasattr(os, "fork"):
+        logger.error("Pre-forked serving needs os.fork; use uvicorn --workers on this platform")
+        return 1
+
+    # Load and warm up once, before any worker exists
+    main._startup_load()
+    if main._api_state["status"] != "ready":
+        logger.error("Model not ready: %s", main._api_state.get("error"))
+        return 1
+    logger.info("Model loaded in %s ms, warm-up %s ms",
+                main._api_state["load_ms"], main._api_state["warmup_ms"])
+
+    # Workers reuse the parent's model and warm-up, and leave reloads to it
+    os.environ["FASHION_AI_WARMUP"] = "0"
+    main._reload_handler = _ask_parent_to_reload
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(args.backlog)
+    sock.set_inheritable(True)
+
+    # Everything allocated so far (the model) leaves the GC's reach
+    gc.collect()
+    gc.freeze()
+
+    workers = [_spawn(sock, args) for _ in range(args.workers)]
+    logger.info("Serving on %s:%d with %d workers: %s", args.host, args.port, len(workers), workers)
+
+    stopping = False
+    reload_requested = False
+
+    def _stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+
+    def _request_reload(signum, _frame):
+        nonlocal reload_requested
+        reload_requested = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGHUP, _request_reload)
+
+    parent_pid = os.getpid()
+    next_report = time.monotonic() + args.report_interval if args.report_interval > 0 else None
+    watch = main.ModelFileWatch()
+    watch_interval = float(os.getenv("FASHION_AI_RELOAD_INTERVAL", "30"))
+    next_watch = time.monotonic() + watch_interval if watch_interval > 0 else None
+    next_state = time.monotonic() + args.state_interval if args.state_interval > 0 else None
+    # Workers of a replaced model, draining their requests; not restarted when they exit
+    retiring: List[int] = []
+
+    while not stopping:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid, status = 0, 0
+
+        if pid and pid in workers:
+            logger.warning("Worker %d exited (status %d), restarting", pid, status)
+            _catch_up_users()
+            workers[workers.index(pid)] = _spawn(sock, args)
+        elif pid in retiring:
+            retiring.remove(pid)
+
+        if next_watch is not None and time.monotonic() >= next_watch:
+            reload_requested = watch.changed() or reload_requested
+            next_watch = time.monotonic() + watch_interval
+
+        replace_workers = False
+        if next_state is not None and time.monotonic() >= next_state:
+            if _catch_up_users():
+                logger.info("User snapshot taken, replacing workers")
+                gc.collect()
+                gc.freeze()
+                replace_workers = True
+            next_state = time.monotonic() + args.state_interval
+
+        if reload_requested:
+            reload_requested = False
+            replace_workers = _reload() or replace_workers
+
+        if replace_workers:
+            # New workers share the listening socket, so requests keep being accepted
+            old_workers, workers = workers, [_spawn(sock, args) for _ in range(args.workers)]
+            for old_pid in old_workers:
+                try:
+                    os.kill(old_pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            retiring += old_workers
+
+        if next_report is not None and time.monotonic() >= next_report:
+            _log_memory(parent_pid, workers)
+            next_report = time.monotonic() + args.report_interval
+
+        time.sleep(0.2)
+
+    logger.info("Stopping workers")
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    deadline = time.monotonic() + args.graceful_timeout
+    remaining = set(workers) | set(retiring)
+    while remaining and time.monotonic() < deadline:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            remaining.discard(pid)
+        else:
+            time.sleep(0.1)
+
+    for pid in remaining:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    _catch_up_users()
+    if main._user_store is not None:
+        main._user_store.close()  # Final snapshot
+
+    sock.close()
+    return 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-forked FitFast AI service")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--report-interval", type=float, default=60.0,
+                        help="Seconds between memory reports, 0 disables them")
+    parser.add_argument("--state-interval", type=float,
+                        default=float(os.getenv("FASHION_AI_STATE_INTERVAL", "10")),
+                        help="Seconds between applying the workers' user writes in the parent, 0 only at exit")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    logging.basicConfig(level=arguments.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+    sys.exit(serve(arguments))
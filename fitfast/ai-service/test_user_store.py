@@ -0,0 +1,120 @@
+"""UserStore with several processes on one directory.
+
+Each process is played by its own UserStore (own file handles and flocks),
+as under serve_prefork: workers append, the parent restores and snapshots.
+"""
+from typing import Any, Dict
+
+from user_store import UserStore
+
+
+class Process:
+    """One process's engine users plus its store"""
+
+    def __init__(self, directory: str) -> None:
+        self.users: Dict[str, Any] = {}
+        self.store = UserStore(directory, users=lambda: self.users, snapshot_every=0)
+
+    def apply(self, entry: Dict[str, Any]) -> None:
+        self.users[entry["payload"]["user_id"]] = entry["payload"]
+
+    def restore(self) -> Dict[str, Any]:
+        return self.store.restore(self.users, self.apply)
+
+    def register(self, user_id: str) -> None:
+        payload = {"user_id": user_id}
+        with self.store.recording():
+            self.apply({"payload": payload})
+            self.store.append("register", payload=payload)
+
+
+def test_append_after_another_process_cut_the_log(tmp_path):
+    parent, worker_a, worker_b = (Process(str(tmp_path)) for _ in range(3))
+    for process in (parent, worker_a, worker_b):
+        process.restore()
+
+    worker_a.register("a1")  # seq 1
+    for index in range(5):  # seq 2-6
+        worker_b.register(f"b{index}")
+
+    parent.restore()
+    assert parent.store.snapshot()  # Snapshot at seq 6, log cut to nothing
+
+    worker_a.register("a2")  # Must be numbered after the snapshot
+
+    parent.restore()
+    assert "a2" in parent.users
+
+    fresh = Process(str(tmp_path))
+    report = fresh.restore()
+    assert report["snapshot_seq"] == 6
+    assert sorted(fresh.users) == ["a1", "a2", "b0", "b1", "b2", "b3", "b4"]
+    for process in (parent, worker_a, worker_b, fresh):
+        process.store.close()
+
+
+def test_process_with_unapplied_writes_does_not_snapshot(tmp_path):
+    owner, other = Process(str(tmp_path)), Process(str(tmp_path))
+    owner.restore()
+    other.restore()
+
+    owner.register("u1")
+    other.register("u2")
+    owner.register("u3")  # Sees u2 in the log without having applied it
+    assert owner.store.stale
+    assert not owner.store.snapshot()
+
+    owner.restore()  # Catches up on u2
+    assert not owner.store.stale
+    assert owner.store.snapshot()
+    assert sorted(owner.users) == ["u1", "u2", "u3"]
+    owner.store.close()
+    other.store.close()
+
+
+def test_catch_up_applies_only_other_processes_writes(tmp_path):
+    worker_a, worker_b = Process(str(tmp_path)), Process(str(tmp_path))
+    worker_a.restore()
+    worker_b.restore()
+
+    worker_a.register("a1")
+    worker_b.register("b1")
+    applied = []
+    assert worker_a.store.catch_up(lambda entry: applied.append(entry["payload"]["user_id"])) == 1
+    assert applied == ["b1"]
+    assert worker_a.store.catch_up(applied.append) == 0
+    worker_a.store.close()
+    worker_b.store.close()
+
+
+def test_catch_up_refuses_once_a_snapshot_cut_past_it(tmp_path):
+    parent, worker_a, worker_b = (Process(str(tmp_path)) for _ in range(3))
+    for process in (parent, worker_a, worker_b):
+        process.restore()
+
+    worker_b.register("b1")
+    parent.restore()
+    assert parent.store.snapshot()
+    # b1 is only in the snapshot now; the log cannot bring worker_a up to date
+    assert worker_a.store.catch_up(worker_a.apply) is None
+    for process in (parent, worker_a, worker_b):
+        process.store.close()
+
+
+def test_restore_after_a_snapshot_cut_past_catch_up(tmp_path):
+    owner, other = Process(str(tmp_path)), Process(str(tmp_path))
+    owner.restore()
+    other.restore()
+
+    other.register("o1")
+    owner.register("w1")
+    owner.restore()
+    assert owner.store.snapshot()  # Covers o1 and w1
+    other.register("o2")  # After the snapshot, and only ever applied here
+
+    assert other.store.catch_up(other.apply) is None
+    other.restore()
+    assert sorted(other.users) == ["o1", "o2", "w1"]
+    assert not other.store.stale
+    owner.store.close()
+    other.store.close()
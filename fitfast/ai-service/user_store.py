@@ -0,0 +1,402 @@
+"""Durable user state for the engine: a snapshot plus an append-only log.
+
+    users.snapshot   pickled header, then the engine's users dict as of log
+                     entry <seq>
+    users.log        one JSON line per write (register, purchase) with an
+                     increasing seq
+
+A write first changes the engine, then appends one log line. Every
+snapshot_every writes (and at shutdown), the users dict is pickled under
+an exclusive lock, so no write sits between the engine and the log at that
+moment. The snapshot file is then written outside the lock, and the log is
+cut down to the entries that came after it. A restart loads the snapshot
+and replays only the entries after its seq, so it costs one bulk unpickle
+plus the log tail, not a re-sync of every user.
+
+Crash safety: the snapshot is replaced atomically before the log is cut,
+and entries at or below the snapshot's seq are skipped on replay, so a
+crash between the two steps is harmless. A torn last log line (a crash
+mid-append) is dropped.
+
+Several processes may write one directory. Each append holds a flock on
+the log and takes the next seq from the log itself, so every write is
+kept and no two share a seq. Only one process snapshots (flock on
+users.lock), and only while its users dict holds every logged write: once
+it finds another process's entries in the log, it stops snapshotting
+until restore() or catch_up() has applied them. serve_prefork relies on
+this: its workers append and catch_up() on each other's writes, and the
+parent restore()s and snapshots.
+"""
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+
+from concurrency import ReadWriteLock
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+SNAPSHOT_NAME = "users.snapshot"
+LOG_NAME = "users.log"
+LOCK_NAME = "users.lock"
+SNAPSHOT_FORMAT = "fitfast-user-state"
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_EVERY = 10000
+
+logger = logging.getLogger("fitfast.ai_service.user_store")
+
+
+@contextmanager
+def _flocked(handle: Any, exclusive: bool = True) -> Iterator[None]:
+    """flock handle for the block; without fcntl (Windows) there is one process anyway"""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(handle.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+class UserStore:
+    def __init__(
+        self,
+        directory: str,
+        users: Callable[[], Optional[Dict[str, Any]]],
+        snapshot_every: int = DEFAULT_SNAPSHOT_EVERY,
+        fsync: bool = False,
+    ) -> None:
+        """
+        Args:
+            directory: where the snapshot and log live, created on first write
+            users: returns the live users dict to snapshot (None when unavailable)
+            snapshot_every: writes between snapshots, 0 only snapshots at shutdown
+            fsync: fsync every log line (survives power loss, slower writes)
+        """
+        self.directory = Path(directory)
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        # False in processes that only append (serve_prefork workers)
+        self.snapshots = True
+        self._users = users
+        # Shared while a write is applied and logged, exclusive for the snapshot cut
+        self._cut_lock = ReadWriteLock()
+        self._append_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._catch_up_lock = threading.Lock()
+        self._log: Any = None
+        self._read_pos = 0  # How far this process has read its open log
+        self._lock_file: Any = None
+        self._owner: Optional[bool] = None
+        self.seq = 0  # Highest seq in the log (or the snapshot) this process knows of
+        self.applied_seq = 0  # Every entry up to here is in this process's users
+        self._own: Set[int] = set()  # Entries after applied_seq that this process wrote itself
+        self.since_snapshot = 0
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.directory / SNAPSHOT_NAME
+
+    @property
+    def log_path(self) -> Path:
+        return self.directory / LOG_NAME
+
+    @property
+    def stale(self) -> bool:
+        """The log holds writes of another process that are not in this process's users"""
+        return self.seq - self.applied_seq > len(self._own)
+
+    @property
+    def snapshot_due(self) -> bool:
+        return (self.snapshots and not self.stale and self._owner is not False
+                and 0 < self.snapshot_every <= self.since_snapshot)
+
+    # ========== RESTORE ==========
+    def restore(self, users: Optional[Dict[str, Any]], apply: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        """
+        Load the latest snapshot into users, then apply() each later log entry
+
+        Returns counts and timings for the start-up report. Raises when the
+        snapshot exists but cannot be read; starting without the users is
+        worse than not starting. Calling it again only catches up: entries
+        already applied here are skipped, and afterwards this process holds
+        every logged write and may snapshot again.
+        """
+        start = time.perf_counter()
+        snapshot_seq, snapshot_users = 0, 0
+
+        # Writes of this process wait, so none is missed or applied twice
+        with self._cut_lock.write():
+            seen = self.applied_seq
+            if self.snapshot_path.exists():
+                with self.snapshot_path.open("rb") as handle:
+                    header = self._read_header(handle)
+                    if header["seq"] > seen:
+                        saved = pickle.load(handle)
+                        snapshot_seq, snapshot_users = header["seq"], len(saved)
+                        if users is None:
+                            raise RuntimeError(f"{self.snapshot_path} holds users but the engine has no users dict")
+                        users.update(saved)
+            snapshot_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            replayed, failed, last = 0, 0, 0
+            for entry in self._read_log():
+                self.seq = last = max(self.seq, entry["seq"])
+                if entry["seq"] <= max(snapshot_seq, seen):
+                    continue
+                if not snapshot_seq and entry["seq"] in self._own:
+                    continue  # Written here, so already in users (unless the snapshot replaced them)
+                try:
+                    apply(entry)
+                    replayed += 1
+                except Exception as exc:
+                    failed += 1
+                    logger.warning("Could not replay log entry %s (%s): %s", entry["seq"], entry.get("op"), exc)
+
+            self.seq = max(self.seq, snapshot_seq)
+            self.applied_seq = max(seen, snapshot_seq, last)
+            self._own = {seq for seq in self._own if seq > self.applied_seq}
+            self.since_snapshot += replayed + failed
+
+        return {
+            "snapshot_users": snapshot_users,
+            "snapshot_seq": snapshot_seq,
+            "snapshot_ms": snapshot_ms,
+            "replayed": replayed,
+            "failed": failed,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def catch_up(self, apply: Callable[[Dict[str, Any]], None]) -> Optional[int]:
+        """
+        apply() the entries other processes logged, while this one serves requests
+
+        Unlike restore(), no lock of this store is held while apply() runs;
+        it takes the user's lock and recording() itself. Returns how many
+        entries were applied, or None when a snapshot cut away entries this
+        process never applied, so the log alone cannot bring it up to date.
+        """
+        with self._catch_up_lock:
+            seen = self.applied_seq
+            entries = list(self._read_log())
+            # Read after the log: a snapshot taken in between shows up here
+            if self._snapshot_seq() > seen:
+                return None
+
+            applied, last = 0, seen
+            for entry in entries:
+                last = max(last, entry["seq"])
+                if entry["seq"] <= seen or entry["seq"] in self._own:
+                    continue
+                try:
+                    apply(entry)
+                    applied += 1
+                except Exception as exc:
+                    logger.warning("Could not apply log entry %s (%s): %s", entry["seq"], entry.get("op"), exc)
+
+            with self._cut_lock.write():
+                self.seq = max(self.seq, last)
+                self.applied_seq = max(self.applied_seq, last)
+                self._own = {seq for seq in self._own if seq > self.applied_seq}
+                self.since_snapshot += applied
+            return applied
+
+    def _snapshot_seq(self) -> int:
+        try:
+            with self.snapshot_path.open("rb") as handle:
+                return self._read_header(handle)["seq"]
+        except FileNotFoundError:
+            return 0
+
+    def _read_header(self, handle: Any) -> Dict[str, Any]:
+        header = pickle.load(handle)
+        if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{self.snapshot_path} is not a {SNAPSHOT_FORMAT} snapshot")
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported user snapshot version: {header.get('version')}")
+        return header
+
+    def _read_log(self) -> Iterator[Dict[str, Any]]:
+        try:
+            handle = self.log_path.open("rb")
+        except FileNotFoundError:
+            return
+        with handle, _flocked(handle, exclusive=False):  # No append or cut is half done
+            data = handle.read()
+        yield from self._entries(data)
+
+    def _entries(self, data: bytes) -> Iterator[Dict[str, Any]]:
+        for number, line in enumerate(data.splitlines(), 1):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Only the last line can be torn; anything else is worth a warning too
+                logger.warning("Skipping unreadable line %d of %s", number, self.log_path)
+                continue
+            yield entry
+
+    # ========== WRITES ==========
+    @contextmanager
+    def recording(self) -> Iterator[None]:
+        """Hold around applying a write to the engine and append()ing it"""
+        with self._cut_lock.read():
+            yield
+
+    def append(self, op: str, **fields: Any) -> None:
+        """Log one write; call inside recording(), after the engine accepted it"""
+        with self._append_lock, self._locked_log() as log:
+            self._read_others(log)
+            self.seq += 1
+            self._own.add(self.seq)
+            log.write(json.dumps({"seq": self.seq, "op": op, **fields}, default=str).encode("utf-8") + b"\n")
+            log.flush()
+            if self.fsync:
+                os.fsync(log.fileno())
+            self._read_pos = log.tell()
+            self.since_snapshot += 1
+            due = self.snapshot_due
+
+        if due and not self._snapshot_lock.locked():
+            threading.Thread(target=self.snapshot, name="user-snapshot", daemon=True).start()
+
+    @contextmanager
+    def _locked_log(self) -> Iterator[Any]:
+        """The current log, flocked for the block; call with _append_lock held"""
+        while True:
+            opened = self._log is None
+            if opened:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._log = self.log_path.open("a+b")
+                self._read_pos = 0
+            with _flocked(self._log):
+                try:
+                    current = os.path.samestat(os.fstat(self._log.fileno()), os.stat(self.log_path))
+                except FileNotFoundError:
+                    current = False
+                if current:
+                    if opened:
+                        self._skip_snapshot_seqs()
+                    yield self._log
+                    return
+            # Another process cut the log since it was opened; append to the new one
+            self._log.close()
+            self._log = None
+
+    def _skip_snapshot_seqs(self) -> None:
+        """
+        Never number an entry at or below the snapshot's seq
+
+        A log that was cut starts after the snapshot, which may hold writes
+        of other processes this one never saw. Replay skips everything up to
+        the snapshot's seq, so an entry numbered there would be lost.
+        """
+        self.seq = max(self.seq, self._snapshot_seq())
+
+    def _read_others(self, log: Any) -> None:
+        """Pick up the entries other processes appended since this one last looked"""
+        log.seek(self._read_pos)
+        data = log.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            # Nobody else is mid-append under the flock: a crash left this line torn
+            log.truncate(self._read_pos + end)
+            data = data[:end]
+        self._read_pos += end
+        for entry in self._entries(data):
+            self.seq = max(self.seq, entry["seq"])
+
+    # ========== SNAPSHOTS ==========
+    def snapshot(self) -> bool:
+        """Write the current users as a snapshot and cut the log; False when skipped"""
+        if not self.snapshots or not self._snapshot_lock.acquire(blocking=False):
+            return False
+
+        try:
+            if not self._own_directory():
+                return False
+            users = self._users()
+            if not isinstance(users, dict):
+                logger.warning("Engine has no users dict, user state is only kept in %s", self.log_path)
+                return False
+
+            start = time.perf_counter()
+            with self._cut_lock.write():
+                if self.stale:
+                    logger.warning("Not snapshotting: the log holds writes of another process not applied here")
+                    return False
+                seq = self.seq
+                data = pickle.dumps(users, protocol=pickle.HIGHEST_PROTOCOL)
+                self.applied_seq, self._own = seq, set()
+                self.since_snapshot = 0
+
+            header = {"format": SNAPSHOT_FORMAT, "version": SNAPSHOT_VERSION, "seq": seq, "users": len(users)}
+            tmp_path = self.snapshot_path.with_suffix(".tmp")
+            with tmp_path.open("wb") as handle:
+                pickle.dump(header, handle, protocol=pickle.HIGHEST_PROTOCOL)
+                handle.write(data)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            self._cut_log(seq)
+            logger.info("User snapshot at seq %d: %d users in %.1f ms",
+                        seq, len(users), (time.perf_counter() - start) * 1000)
+            return True
+        finally:
+            self._snapshot_lock.release()
+
+    def _own_directory(self) -> bool:
+        """Take users.lock, which makes this the one process that snapshots"""
+        if self._owner is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            lock_file = (self.directory / LOCK_NAME).open("a")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                logger.warning("Another process snapshots %s; this one only appends to the log", self.directory)
+                self._owner = False
+                return False
+            self._lock_file = lock_file
+            self._owner = True
+        return self._owner
+
+    def _cut_log(self, seq: int) -> None:
+        """Keep only the log entries after seq, which the snapshot does not cover"""
+        with self._append_lock:
+            with self._locked_log() as log:
+                log.seek(0)
+                kept = [entry for entry in self._entries(log.read()) if entry["seq"] > seq]
+                tmp_path = self.log_path.with_suffix(".tmp")
+                with tmp_path.open("w", encoding="utf-8") as handle:
+                    for entry in kept:
+                        handle.write(json.dumps(entry, default=str) + "\n")
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                # Appenders waiting for the flock on the old file see the swap and reopen
+                os.replace(tmp_path, self.log_path)
+            self._log.close()
+            self._log = None
+
+    def close(self) -> None:
+        """Final snapshot, then release the log and the directory"""
+        if self.since_snapshot:
+            self.snapshot()
+        with self._append_lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+            self._owner = None
@@ -663,18 +663,23 @@ private function callPythonSizeApi(array $measurements, string $garmentType, int
             'timestamp' => now()->toISOString(),
         ];
 
-        $tempFile = tempnam(sys_get_temp_dir(), 'size_req_') . '.json';
-        file_put_contents($tempFile, json_encode($data));
+        // Prefer the resident daemon; fall back to a one-shot Python process
+        $output = $this->callAiDaemon('size', $data);
 
-        Log::debug('Calling Python size API', [
-            'script' => $pythonScript,
-            'data' => $data,
-        ]);
+        if ($output === null) {
+            $tempFile = tempnam(sys_get_temp_dir(), 'size_req_') . '.json';
+            file_put_contents($tempFile, json_encode($data));
+
+            Log::debug('Calling Python size API', [
+                'script' => $pythonScript,
+                'data' => $data,
+            ]);
 
-        $command = 'python "' . $pythonScript . '" "' . $tempFile . '" 2>&1';
-        $output = shell_exec($command);
+            $command = 'python "' . $pythonScript . '" "' . $tempFile . '" 2>&1';
+            $output = shell_exec($command);
 
-        unlink($tempFile);
+            unlink($tempFile);
+        }
 
         if (!$output) {
             throw new \Exception('Python script returned no output. Check if Python is installed and accessible.');
@@ -733,18 +738,23 @@ private function callPythonOutfitApi(int $startingItemId, array $measurements, s
             'timestamp' => now()->toISOString(),
         ];
 
-        $tempFile = tempnam(sys_get_temp_dir(), 'outfit_req_') . '.json';
-        file_put_contents($tempFile, json_encode($data));
+        // Prefer the resident daemon; fall back to a one-shot Python process
+        $output = $this->callAiDaemon('outfit', $data);
 
-        Log::debug('Calling Python outfit API', [
-            'script' => $pythonScript,
-            'data' => $data,
-        ]);
+        if ($output === null) {
+            $tempFile = tempnam(sys_get_temp_dir(), 'outfit_req_') . '.json';
+            file_put_contents($tempFile, json_encode($data));
 
-        $command = 'python "' . $pythonScript . '" "' . $tempFile . '" 2>&1';
-        $output = shell_exec($command);
+            Log::debug('Calling Python outfit API', [
+                'script' => $pythonScript,
+                'data' => $data,
+            ]);
 
-        unlink($tempFile);
+            $command = 'python "' . $pythonScript . '" "' . $tempFile . '" 2>&1';
+            $output = shell_exec($command);
+
+            unlink($tempFile);
+        }
 
         if (!$output) {
             throw new \Exception('Python script returned no output.');
@@ -782,6 +792,40 @@ private function callPythonOutfitApi(int $startingItemId, array $measurements, s
         return $result;
     }
 
+    private function callAiDaemon(string $endpoint, array $data): ?string
+    {
+        $address = config('services.ai_daemon.address');
+        if (empty($address)) {
+            return null;
+        }
+
+        $timeout = (float) config('services.ai_daemon.timeout', 10);
+        $socket = @stream_socket_client($address, $errno, $errstr, $timeout);
+
+        if ($socket === false) {
+            Log::warning('AI daemon unavailable, falling back to Python script', [
+                'address' => $address,
+                'error' => $errstr,
+            ]);
+            return null;
+        }
+
+        stream_set_timeout($socket, (int) ceil($timeout));
+        fwrite($socket, json_encode(['endpoint' => $endpoint] + $data) . "\n");
+        $output = fgets($socket);
+        fclose($socket);
+
+        if ($output === false) {
+            Log::warning('AI daemon returned no output, falling back to Python script', [
+                'address' => $address,
+                'endpoint' => $endpoint,
+            ]);
+            return null;
+        }
+
+        return $output;
+    }
+
     // ========== DATABASE HELPER METHODS ==========
 
     private function getSimilarItems(int $itemId, int $limit): array
@@ -40,4 +40,10 @@
         'timeout' => env('AI_SERVICE_TIMEOUT', 10),
     ],
 
+    'ai_daemon' => [
+        // e.g. unix:///tmp/fitfast-ai.sock or tcp://127.0.0.1:8765 (see frontend/src/ai/ai_daemon.py)
+        'address' => env('AI_DAEMON_ADDRESS'),
+        'timeout' => env('AI_DAEMON_TIMEOUT', 10),
+    ],
+
 ];
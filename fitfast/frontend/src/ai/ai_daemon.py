@@ -0,0 +1,159 @@
+# ai_daemon.py - RESIDENT SIZE + OUTFIT SERVER, PURE JSON LINES ONLY
+#
+# Loads both models once and answers requests until stopped, so callers no
+# longer pay interpreter start-up and unpickling on every call.
+#
+#   python ai_daemon.py --socket /tmp/fitfast-ai.sock   (Unix socket)
+#   python ai_daemon.py --port 8765                     (TCP on 127.0.0.1)
+#   python ai_daemon.py --stdio                         (stdin/stdout)
+#
+# Framing: one JSON object per line in, one JSON object per line out.
+# Requests are the same payloads size_api.py / outfit_api.py read from their
+# temp file, plus an "endpoint" key ("size", "outfit" or "ping"). Responses
+# are exactly what the one-shot scripts print.
+import sys
+import json
+import os
+import argparse
+import socket
+import socketserver
+import stat
+
+import size_api
+import outfit_api
+
+
+class ModelRegistry:
+    """Both models, loaded once per process"""
+
+    def __init__(self):
+        self.size_model, self.size_model_file = size_api.load_size_model()
+        self.outfit_model, self.outfit_model_file = outfit_api.load_outfit_model()
+
+    def handle(self, request_data):
+        """Dispatch one decoded request to the matching handler"""
+        endpoint = request_data.get("endpoint", "size")
+
+        if endpoint == "size":
+            return size_api.handle_request(self.size_model, self.size_model_file, request_data)
+        if endpoint == "outfit":
+            return outfit_api.handle_request(self.outfit_model, self.outfit_model_file, request_data)
+        if endpoint == "ping":
+            return {
+                "success": True,
+                "size_model": self.size_model_file,
+                "outfit_model": self.outfit_model_file
+            }
+
+        return {"success": False, "message": f"Unknown endpoint: {endpoint}"}
+
+    def handle_line(self, line):
+        """Decode one request line and return one encoded response line"""
+        try:
+            request_data = json.loads(line)
+            if not isinstance(request_data, dict):
+                raise ValueError("Request must be a JSON object")
+            result = self.handle(request_data)
+            # Inside the try: a result JSON cannot encode is that request's error
+            return json.dumps(result) + "\n"
+        except Exception as e:
+            return json.dumps({"success": False, "message": str(e)}) + "\n"
+
+
+class _LineHandler(socketserver.StreamRequestHandler):
+    """Serve newline-delimited requests on one client connection"""
+
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8").strip()
+            if not line:
+                continue
+            self.wfile.write(self.server.registry.handle_line(line).encode("utf-8"))
+            self.wfile.flush()
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:  # Windows without AF_UNIX support
+    _ThreadingUnixServer = None
+
+
+def serve_stdio(registry, stdin=None, stdout=None):
+    """Answer requests read from stdin until EOF"""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        stdout.write(registry.handle_line(line))
+        stdout.flush()
+
+
+def _remove_stale_socket(socket_path):
+    """Remove a socket left behind by a daemon that is gone; never anything else"""
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f"{socket_path} exists and is not a socket")
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except ConnectionRefusedError:
+        os.unlink(socket_path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"Another daemon is already listening on {socket_path}")
+
+
+def serve_socket(registry, socket_path=None, host="127.0.0.1", port=None):
+    """Answer requests on a Unix socket (or TCP port) until interrupted"""
+    if socket_path:
+        if _ThreadingUnixServer is None:
+            raise RuntimeError("Unix sockets are not supported here, use --port instead")
+        _remove_stale_socket(socket_path)
+        server = _ThreadingUnixServer(socket_path, _LineHandler)
+    else:
+        server = _ThreadingTCPServer((host, port), _LineHandler)
+
+    server.registry = registry
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident FitFast size/outfit model server")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--socket", help="Unix socket path to listen on")
+    mode.add_argument("--port", type=int, help="TCP port to listen on")
+    mode.add_argument("--stdio", action="store_true", help="Read requests from stdin")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host for --port")
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+
+    if args.stdio:
+        serve_stdio(registry)
+    else:
+        serve_socket(registry, socket_path=args.socket, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,478 @@
 # ai_module.py - REAL IMPLEMENTATION (with actual logic)
-import pandas as pd
+#
+# Serving paths only need NumPy. pandas is imported inside the functions
+# that build indexes and statistics from DataFrames, so opening an
+# artifact and answering requests never pays for importing it.
 import numpy as np
 import json
+import os
 import pickle
-from sklearn.metrics.pairwise import cosine_similarity
+import time
+
+def _scalar(value):
+    """Plain Python value for a NumPy scalar"""
+    return value.item() if isinstance(value, np.generic) else value
+
+# Bump when anything derived from the inputs (indexes, statistics, item
+# metadata, rules, themes) or its stored form changes, so cached derived
+# indexes are rebuilt. 2: size labels keep their type
+DERIVED_CACHE_VERSION = 2
+
+# Default cache_dir for load_data() and IntelligentOutfitBuilder()
+DERIVED_CACHE_ENV = 'FITFAST_DERIVED_CACHE'
+
+def _notna(value):
+    """pd.notna for a single value"""
+    if value is None:
+        return False
+    return not (isinstance(value, (float, np.floating)) and np.isnan(value))
+
+def _factorize(values):
+    """
+    pd.factorize without pandas: codes in order of first appearance
+
+    Missing values (None, NaN) get code -1 and are left out of the uniques.
+    """
+    uniques = {}
+    codes = np.empty(len(values), dtype=np.intp)
+    for i, value in enumerate(values):
+        codes[i] = uniques.setdefault(value, len(uniques)) if _notna(value) else -1
+    return codes, list(uniques)
+
+def _select_top_rows(scores, rows, top_k):
+    """
+    The top_k of rows by score, best first, ties kept in row order
+
+    The k-th best score is a bound: rows below it can never make the
+    result, so they are dropped before anything is sorted. top_k follows
+    list slicing, so None keeps every row.
+    """
+    if top_k is not None and 0 <= top_k < len(rows):
+        if top_k == 0:
+            return rows[:0]
+
+        candidate_scores = scores[rows]
+        kth = len(rows) - top_k
+        bound = np.partition(candidate_scores, kth)[kth]
+        rows = rows[candidate_scores >= bound]
+
+    order = np.lexsort((rows, -scores[rows]))
+    return rows[order][:top_k]
+
+# ========== ITEM CATALOG (COLUMNAR) ==========
+class ItemCatalog:
+    """
+    Column-oriented item information with an id -> row index
+
+    Text columns that repeat (category, store, garment type) are stored as
+    integer codes into a table of unique values. Rows are only turned into
+    dicts when a recommendation is returned.
+    """
+
+    def __init__(self, item_ids, names, prices, categories, stores, total_stocks, garment_types):
+        self.item_ids = np.asarray(item_ids, dtype=object)
+        self.names = np.asarray(names, dtype=object)
+        self.prices = np.asarray(prices)
+        self.total_stocks = np.asarray(total_stocks)
+        self.category_codes, self.category_values = self._intern(categories)
+        self.store_codes, self.store_values = self._intern(stores)
+        self.garment_type_codes, self.garment_type_values = self._intern(garment_types)
+
+        # Later rows win on duplicate ids, as the old per-row dict did
+        self.index = {item_id: row for row, item_id in enumerate(self.item_ids)}
+
+    @staticmethod
+    def _intern(values):
+        """Integer codes plus the unique values they point into"""
+        import pandas as pd
+
+        codes, uniques = pd.factorize(pd.Series(list(values), dtype=object), use_na_sentinel=False)
+        return codes.astype(np.int32), np.asarray(uniques, dtype=object)
+
+    @classmethod
+    def from_dataframe(cls, original_df):
+        """Build from the original item export (ID, Name, Price, ...)"""
+        def column(name, default):
+            if name in original_df.columns:
+                return original_df[name].to_numpy()
+            return np.full(len(original_df), default, dtype=object)
+
+        if 'ID' in original_df.columns:
+            item_ids = original_df['ID'].tolist()
+        else:
+            item_ids = [idx + 1 for idx in original_df.index]
+
+        return cls(
+            item_ids,
+            column('Name', ''),
+            column('Price', 0),
+            column('Category', ''),
+            column('Store', ''),
+            column('Total Stock', 0),
+            column('Garment Type', '')
+        )
+
+    @classmethod
+    def from_records(cls, item_info):
+        """Build from the older {item_id: {...}} dict layout"""
+        records = list(item_info.values())
+        return cls(
+            list(item_info.keys()),
+            [r.get('name', '') for r in records],
+            [r.get('price', 0) for r in records],
+            [r.get('category', '') for r in records],
+            [r.get('store', '') for r in records],
+            [r.get('total_stock', 0) for r in records],
+            [r.get('garment_type_db', '') for r in records]
+        )
+
+    def to_columns(self):
+        """Arrays and unique-value tables for an artifact, see artifact_store"""
+        from artifact_store import id_array, text_array
+
+        arrays = {
+            'catalog_item_ids': id_array(self.item_ids.tolist()),
+            'catalog_names': text_array(self.names),
+            'catalog_prices': np.asarray(self.prices, dtype=float),
+            'catalog_total_stocks': (self.total_stocks.astype(float) if self.total_stocks.dtype.hasobject
+                                     else self.total_stocks),
+            'catalog_category_codes': self.category_codes,
+            'catalog_store_codes': self.store_codes,
+            'catalog_garment_type_codes': self.garment_type_codes,
+        }
+        tables = {
+            'category_values': [_scalar(v) for v in self.category_values],
+            'store_values': [_scalar(v) for v in self.store_values],
+            'garment_type_values': [_scalar(v) for v in self.garment_type_values],
+        }
+        return arrays, tables
+
+    @classmethod
+    def from_columns(cls, arrays, tables):
+        """Rebuild from to_columns() output; numeric columns stay memory-mapped"""
+        catalog = cls.__new__(cls)
+        catalog.item_ids = np.asarray(arrays['catalog_item_ids'].tolist(), dtype=object)
+        catalog.names = np.asarray(arrays['catalog_names'].tolist(), dtype=object)
+        catalog.prices = arrays['catalog_prices']
+        catalog.total_stocks = arrays['catalog_total_stocks']
+        catalog.category_codes = arrays['catalog_category_codes']
+        catalog.category_values = np.asarray(tables['category_values'], dtype=object)
+        catalog.store_codes = arrays['catalog_store_codes']
+        catalog.store_values = np.asarray(tables['store_values'], dtype=object)
+        catalog.garment_type_codes = arrays['catalog_garment_type_codes']
+        catalog.garment_type_values = np.asarray(tables['garment_type_values'], dtype=object)
+        catalog.index = {item_id: row for row, item_id in enumerate(catalog.item_ids)}
+        return catalog
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.index
+
+    def get(self, item_id, default=None):
+        """Materialize one item as a dict"""
+        row = self.index.get(item_id)
+        if row is None:
+            return default
+
+        return {
+            'name': self.names[row],
+            'price': _scalar(self.prices[row]),
+            'category': self.category_values[self.category_codes[row]],
+            'store': self.store_values[self.store_codes[row]],
+            'total_stock': _scalar(self.total_stocks[row]),
+            'garment_type_db': self.garment_type_values[self.garment_type_codes[row]]
+        }
 
 # ========== SIZE RECOMMENDER V2 (REAL LOGIC) ==========
 class SizeRecommenderV2:
     def __init__(self):
         self.measurement_db = None
-        self.item_info = {}
+        self.item_catalog = None
         self.garment_stats = {}
+        self._garment_index = None
+        self._fit_tables = {}
+
+    def __getstate__(self):
+        """Derived tables are rebuilt on demand, keep them out of pickles"""
+        state = self.__dict__.copy()
+        state.pop('_fit_tables', None)
+        return state
+
+    def __setstate__(self, state):
+        """Move pickles that still carry the item_info dict onto the catalog"""
+        item_info = state.pop('item_info', None)
+        if item_info is not None and state.get('item_catalog') is None:
+            state['item_catalog'] = ItemCatalog.from_records(item_info)
+        self.__dict__.update(state)
+
+    def load_data(self, measurement_db, original_df, cache_dir=None):
+        """
+        Load measurement database and item information
 
-    def load_data(self, measurement_db, original_df):
-        """Load measurement database and item information"""
+        With cache_dir (default: $FITFAST_DERIVED_CACHE), the garment index,
+        item catalog and statistics are kept there under a content hash of
+        both DataFrames. A later call
+        with the same data (e.g. after a restart) opens them instead of
+        recomputing; changed data gets a new entry.
+        """
         self.measurement_db = measurement_db
 
+        cache_dir = cache_dir or os.environ.get(DERIVED_CACHE_ENV)
+        cache_path = None
+        if cache_dir:
+            from artifact_store import content_hash, cache_entry_path, load_artifact, is_artifact
+
+            key = content_hash('size_recommender', DERIVED_CACHE_VERSION, measurement_db, original_df)
+            cache_path = cache_entry_path(cache_dir, 'size_recommender', key)
+            if is_artifact(cache_path):
+                self._restore_derived(*load_artifact(cache_path, 'size_recommender'))
+                return
+
+        self._garment_index = self._build_garment_index()
+        self._fit_tables = {}
+
         # Store item information
-        for idx, row in original_df.iterrows():
-            item_id = row.get('ID', idx + 1)
-            self.item_info[item_id] = {
-                'name': row.get('Name', ''),
-                'price': row.get('Price', 0),
-                'category': row.get('Category', ''),
-                'store': row.get('Store', ''),
-                'total_stock': row.get('Total Stock', 0),
-                'description': row.get('Description', ''),
-                'garment_type_db': row.get('Garment Type', '')
-            }
+        self.item_catalog = ItemCatalog.from_dataframe(original_df)
 
         # Calculate statistics
         self._calculate_statistics()
 
+        if cache_path:
+            self._write_derived_cache(cache_path)
+
         # Removed debug prints
 
+    def _write_derived_cache(self, cache_path):
+        """Publish derived state as a cache entry; a cache that cannot be written is skipped"""
+        from artifact_store import publish_artifact
+
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            publish_artifact(cache_path, self.save_artifact)
+        except (OSError, TypeError, ValueError):
+            # The data is already built in memory; only the cache entry is lost
+            pass
+
+    def save_artifact(self, path):
+        """
+        Write the recommender as a memory-mappable artifact directory
+
+        The garment index and item catalog are stored as .npy arrays and
+        garment_stats as JSON, see artifact_store. measurement_db itself is
+        not stored; load_data() is what needs it.
+        """
+        from artifact_store import save_artifact, id_array, label_arrays, encode_meta
+
+        arrays = {}
+        meta = {'garment_stats': encode_meta(self.garment_stats), 'catalog': None, 'garment_types': None}
+
+        if self.item_catalog is not None:
+            catalog_arrays, meta['catalog'] = self.item_catalog.to_columns()
+            arrays.update(catalog_arrays)
+
+        index = self._get_garment_index()
+        if index is not None:
+            blocks = [index['blocks'][gt] for gt in index['garment_types']]
+            n_rows = len(index['values'])
+
+            # Blocks are contiguous, so one offsets array serves all of them
+            arrays['index_values'] = index['values']
+            # Sizes keep their type (30 stays 30, not '30'), see label_arrays
+            size_arrays, meta['size_kind'] = label_arrays('index_sizes', index['sizes'])
+            arrays.update(size_arrays)
+            arrays['index_type_bounds'] = np.array([b['start'] for b in blocks] + [n_rows], dtype=np.int64)
+            arrays['index_type_items'] = np.cumsum([0] + [len(b['item_ids']) for b in blocks]).astype(np.int64)
+            arrays['index_item_offsets'] = np.concatenate(
+                [b['offsets'][:-1] for b in blocks] + [[n_rows]]).astype(np.int64)
+            arrays['index_item_ids'] = id_array(
+                [item_id for b in blocks for item_id in b['item_ids'].tolist()])
+            meta['garment_types'] = list(index['garment_types'])
+            meta['columns'] = list(index['columns'])
+
+        save_artifact(path, 'size_recommender', arrays, meta)
+
+    @classmethod
+    def load_artifact(cls, path, mmap=True):
+        """Open a save_artifact() directory; the measurement values stay memory-mapped"""
+        from artifact_store import load_artifact
+
+        arrays, meta = load_artifact(path, 'size_recommender', mmap=mmap)
+
+        recommender = cls()
+        recommender._restore_derived(arrays, meta)
+        return recommender
+
+    def _restore_derived(self, arrays, meta):
+        """Set garment_stats, item_catalog and the garment index from artifact arrays"""
+        from artifact_store import labels_from_arrays, decode_meta
+
+        self.garment_stats = decode_meta(meta['garment_stats'])
+        self.item_catalog = None
+        self._garment_index = None
+        self._fit_tables = {}
+
+        if meta['catalog'] is not None:
+            self.item_catalog = ItemCatalog.from_columns(arrays, meta['catalog'])
+
+        if meta['garment_types'] is not None:
+            bounds, type_items = arrays['index_type_bounds'], arrays['index_type_items']
+            offsets, item_ids = arrays['index_item_offsets'], arrays['index_item_ids']
+
+            blocks = {}
+            for code, garment_type in enumerate(meta['garment_types']):
+                first, last = int(type_items[code]), int(type_items[code + 1])
+                blocks[garment_type] = {
+                    'start': int(bounds[code]),
+                    'stop': int(bounds[code + 1]),
+                    'item_ids': item_ids[first:last],
+                    'offsets': offsets[first:last + 1],
+                }
+
+            # item_locations is rebuilt on first use, see _locate_item
+            self._garment_index = {
+                'garment_types': list(meta['garment_types']),
+                'columns': list(meta['columns']),
+                'values': arrays['index_values'],
+                # Artifacts written before size_kind stored every size as text
+                'sizes': labels_from_arrays(arrays, 'index_sizes', meta.get('size_kind', 'str')),
+                'blocks': blocks,
+            }
+
     def _calculate_statistics(self):
         """Calculate statistics for each garment type"""
         if self.measurement_db.empty:
             return
 
-        for garment_type in self.measurement_db['garment_type'].unique():
-            type_data = self.measurement_db[self.measurement_db['garment_type'] == garment_type]
+        db = self.measurement_db
+        measurement_cols = [col for col in db.columns
+                            if col not in ['item_id', 'item_name', 'garment_type', 'size',
+                                           'fit_type', 'ease', 'stretch', 'size_system']]
+
+        by_type = db.groupby('garment_type', sort=False)
+        total_items = by_type['item_id'].nunique()
+        type_sizes = by_type['size'].unique()
+
+        # Common measurements appear in > 50% of a garment type's records
+        notna_counts = db[measurement_cols].notna().groupby(db['garment_type'], sort=False).sum()
+        common = notna_counts.gt(by_type.size() * 0.5, axis=0)
+
+        # One aggregation for every (garment type, size) and measurement
+        aggregated = db.groupby(['garment_type', 'size'], sort=False)[measurement_cols].agg(
+            ['count', 'min', 'max', 'mean', 'std'])
+        group_rows = {key: row for row, key in enumerate(aggregated.index)}
+        size_values = {
+            stat: aggregated.xs(stat, axis=1, level=1)[measurement_cols].to_numpy(dtype=float)
+            for stat in ['count', 'min', 'max', 'mean', 'std']
+        }
 
+        for garment_type in total_items.index:
             stats = {
-                'total_items': type_data['item_id'].nunique(),
-                'available_sizes': sorted(type_data['size'].unique()),
+                'total_items': int(total_items[garment_type]),
+                'available_sizes': sorted(_scalar(size) for size in type_sizes[garment_type]),
                 'common_measurements': [],
                 'size_stats': {}
             }
 
-            # Find common measurements (appear in > 50% of records)
-            measurement_cols = [col for col in type_data.columns
-                              if col not in ['item_id', 'item_name', 'garment_type', 'size',
-                                           'fit_type', 'ease', 'stretch', 'size_system']]
+            for col_index, col in enumerate(measurement_cols):
+                if not common.at[garment_type, col]:
+                    continue
 
-            for col in measurement_cols:
-                if type_data[col].notna().sum() > len(type_data) * 0.5:
-                    stats['common_measurements'].append(col)
-
-                    # Calculate stats per size
-                    size_stats = {}
-                    for size in stats['available_sizes']:
-                        size_values = type_data[type_data['size'] == size][col]
-                        if size_values.notna().any():
-                            size_stats[size] = {
-                                'min': float(size_values.min()),
-                                'max': float(size_values.max()),
-                                'mean': float(size_values.mean()),
-                                'std': float(size_values.std())
-                            }
-                    stats['size_stats'][col] = size_stats
+                stats['common_measurements'].append(col)
+
+                # Calculate stats per size
+                size_stats = {}
+                for size in stats['available_sizes']:
+                    row = group_rows.get((garment_type, size))
+                    if row is not None and size_values['count'][row, col_index] > 0:
+                        size_stats[size] = {
+                            'min': float(size_values['min'][row, col_index]),
+                            'max': float(size_values['max'][row, col_index]),
+                            'mean': float(size_values['mean'][row, col_index]),
+                            'std': float(size_values['std'][row, col_index])
+                        }
+                stats['size_stats'][col] = size_stats
 
             self.garment_stats[garment_type] = stats
 
+    def _build_garment_index(self):
+        """
+        Partition measurement_db by garment type, then by item
+
+        Rows are reordered into one contiguous block per garment type (sorted
+        by name) and, inside it, one run per item in order of first
+        appearance, sizes keeping their original row order. Each block stores
+        its row bounds, item ids and per-item row offsets, so looking up a
+        garment type or an item is a slice instead of a scan.
+        """
+        if self.measurement_db is None:
+            return None
+
+        import pandas as pd
+
+        db = self.measurement_db
+        measurement_cols = [col for col in db.columns
+                            if col not in ['item_id', 'item_name', 'garment_type', 'size',
+                                           'fit_type', 'ease', 'stretch', 'size_system']]
+
+        type_codes, garment_types = pd.factorize(db['garment_type'], sort=True)
+        item_groups = db.groupby(['garment_type', 'item_id'], sort=False).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+
+        keep = np.flatnonzero((type_codes >= 0) & (item_groups >= 0))
+        order = keep[np.lexsort((keep, item_groups[keep], type_codes[keep]))]
+
+        type_codes = type_codes[order]
+        item_groups = item_groups[order]
+        item_ids = db['item_id'].to_numpy()[order]
+
+        type_bounds = np.searchsorted(type_codes, np.arange(len(garment_types) + 1))
+        item_starts = np.flatnonzero(np.r_[True, item_groups[1:] != item_groups[:-1]])
+
+        blocks = {}
+        for code, garment_type in enumerate(garment_types):
+            start, stop = int(type_bounds[code]), int(type_bounds[code + 1])
+            first, last = np.searchsorted(item_starts, [start, stop])
+            offsets = np.append(item_starts[first:last], stop)
+
+            blocks[garment_type] = {
+                'start': start,
+                'stop': stop,
+                'item_ids': item_ids[offsets[:-1]],
+                'offsets': offsets,
+            }
+
+        return {
+            'garment_types': list(garment_types),
+            'columns': measurement_cols,
+            'values': db[measurement_cols].iloc[order].apply(
+                pd.to_numeric, errors='coerce').to_numpy(dtype=float),
+            'sizes': db['size'].to_numpy()[order],
+            'blocks': blocks,
+            'item_locations': self._build_item_locations(blocks),
+        }
+
+    @staticmethod
+    def _build_item_locations(blocks):
+        """item_id -> (garment_type, fit-table row)"""
+        item_locations = {}
+        for garment_type, block in blocks.items():
+            # An item listed under several garment types resolves to the first
+            for row, item_id in enumerate(block['item_ids'].tolist()):
+                item_locations.setdefault(item_id, (garment_type, row))
+        return item_locations
+
+    def _get_garment_index(self):
+        """Partitioned garment index, built on first use for older pickles"""
+        if getattr(self, '_garment_index', None) is None:
+            self._garment_index = self._build_garment_index()
+        return self._garment_index
+
     def get_garment_types(self):
         """Get list of available garment types"""
-        if self.measurement_db is not None:
-            return sorted(self.measurement_db['garment_type'].unique())
+        index = self._get_garment_index()
+        if index is not None:
+            return list(index['garment_types'])
         return []
 
     def get_garment_stats(self, garment_type):
@@ -98,92 +494,310 @@ class SizeRecommenderV2:
         """
         # Removed debug prints
 
-        # Get items of this garment type
-        garment_items = self.measurement_db[self.measurement_db['garment_type'] == garment_type]
-
-        if garment_items.empty:
+        table = self._get_fit_table(garment_type)
+        if table is None:
             return []
 
-        recommendations = []
-        processed_items = set()
+        user_values, user_known = self._user_vector(table['measurements'], user_measurements)
+        scores = self._score_fit_table(table, user_values, user_known)
 
-        # For each unique item
-        for item_id in garment_items['item_id'].unique():
-            if item_id in processed_items:
-                continue
+        # Best size per item: first size with the highest score
+        best_sizes = np.argmax(scores, axis=1)
+        best_scores = scores[np.arange(len(best_sizes)), best_sizes]
 
-            item_sizes = garment_items[garment_items['item_id'] == item_id]
-            item_info = self.item_info.get(item_id, {})
-
-            # Find best size for this user in this item
-            best_fit = self._find_best_size_for_item(user_measurements, item_sizes, garment_type)
-
-            if best_fit and best_fit['overall_fit_score'] >= min_fit_score:
-                recommendation = {
-                    'item_id': item_id,
-                    'item_name': item_info.get('name', f'Item {item_id}'),
-                    'price': item_info.get('price', 0),
-                    'category': item_info.get('category', ''),
-                    'store': item_info.get('store', ''),
-                    'garment_type': garment_type,
-                    'recommended_size': best_fit['size'],
-                    'overall_fit_score': best_fit['overall_fit_score'],
-                    'fit_assessment': best_fit['fit_assessment'],
-                    'key_measurements': best_fit.get('key_measurements', {}),
-                    'available_sizes': list(item_sizes['size'].unique()),
-                    'size_comparison': best_fit.get('size_comparison', {})
-                }
+        # Only the final top_k rows get their detail built
+        rows = np.flatnonzero(best_scores >= min_fit_score)
+        rows = _select_top_rows(best_scores, rows, top_k)
+
+        return [
+            self._build_recommendation(table, row, best_sizes[row], best_scores[row],
+                                       user_measurements, garment_type)
+            for row in rows
+        ]
+
+    def recommend_size_for_item(self, item_id, user_measurements, min_fit_score=0.3):
+        """
+        Best fitting size of one specific item for the user
 
-                recommendations.append(recommendation)
-                processed_items.add(item_id)
+        Only that item's sizes are scored. Returns a recommendation dict in
+        the same shape as find_best_fitting_items, or None when the item is
+        unknown or its best size scores below min_fit_score.
+        """
+        location = self._locate_item(item_id)
+        if location is None:
+            return None
 
-        # Sort by fit score
-        recommendations.sort(key=lambda x: x['overall_fit_score'], reverse=True)
+        garment_type, row = location
+        table = self._get_fit_table(garment_type)
 
-        return recommendations[:top_k]
+        item_table = {
+            'values': table['values'][row:row + 1],
+            'present': table['present'][row:row + 1],
+            'thresholds': table['thresholds'],
+            'band_scores': table['band_scores'],
+        }
+        user_values, user_known = self._user_vector(table['measurements'], user_measurements)
+        scores = self._score_fit_table(item_table, user_values, user_known)[0]
 
-    def _find_best_size_for_item(self, user_measurements, item_sizes_df, garment_type):
-        """Find the best fitting size for a specific item"""
-        best_size = None
-        best_score = -1
-        best_details = {}
+        best_size = int(np.argmax(scores))
+        if scores[best_size] < min_fit_score:
+            return None
 
-        # Get key measurements for this garment type
-        key_measurements = self._get_key_measurements(garment_type)
+        return self._build_recommendation(table, row, best_size, scores[best_size],
+                                          user_measurements, garment_type)
 
-        # For each available size in this item
-        for _, size_row in item_sizes_df.iterrows():
-            size_name = size_row['size']
+    def _locate_item(self, item_id):
+        """(garment_type, fit-table row) of an item id, accepting string ids"""
+        index = self._get_garment_index()
+        if index is None:
+            return None
 
-            # Calculate fit for this size
-            fit_result = self._calculate_fit_score(user_measurements, size_row, key_measurements)
+        locations = index.get('item_locations')
+        if locations is None:  # Opened from an artifact
+            locations = index['item_locations'] = self._build_item_locations(index['blocks'])
 
-            if fit_result['overall_score'] > best_score:
-                best_score = fit_result['overall_score']
-                best_size = size_name
-                best_details = fit_result
+        if item_id in locations:
+            return locations[item_id]
 
-        if best_size is None:
+        try:
+            return locations.get(int(item_id))
+        except (TypeError, ValueError):
             return None
 
-        # Determine fit assessment
-        if best_score >= 0.8:
-            assessment = "Excellent Fit"
-        elif best_score >= 0.6:
-            assessment = "Good Fit"
-        elif best_score >= 0.4:
-            assessment = "Fair Fit"
-        else:
-            assessment = "Poor Fit"
+    def _build_recommendation(self, table, row, best_size, best_score, user_measurements, garment_type):
+        """Materialize one fit-table row as a recommendation dict"""
+        item_id = table['item_ids'][row]
+        item_info = self.item_catalog.get(item_id, {}) if self.item_catalog is not None else {}
+        best_score = float(best_score)
+
+        size_values = dict(zip(table['measurements'], table['values'][row, best_size].tolist()))
+        best_details = self._calculate_fit_score(user_measurements, size_values, table['measurements'])
 
         return {
-            'size': best_size,
+            'item_id': item_id,
+            'item_name': item_info.get('name', f'Item {item_id}'),
+            'price': item_info.get('price', 0),
+            'category': item_info.get('category', ''),
+            'store': item_info.get('store', ''),
+            'garment_type': garment_type,
+            'recommended_size': table['sizes'][row, best_size],
             'overall_fit_score': best_score,
-            'fit_assessment': assessment,
+            'fit_assessment': self._overall_fit_assessment(best_score),
             'key_measurements': best_details.get('measurement_scores', {}),
+            'available_sizes': table['available_sizes'][row],
             'size_comparison': best_details.get('comparison', {})
         }
 
+    def find_best_fitting_items_batch(self, users, garment_type, top_k=5,
+                                      min_fit_score=0.3, measurements=None):
+        """
+        Best fitting items and sizes for many users in one pass
+
+        Args:
+            users: list of measurement dicts, or a (n_users, n_measurements)
+                array whose columns are named by `measurements` (NaN = unknown)
+            garment_type: type of garment to search for
+            top_k: number of recommendations per user
+            min_fit_score: minimum fit score to include
+            measurements: column names for an array `users`
+
+        Returns:
+            Dict of arrays. For user u and rank j, the item is
+            item_ids[rows[u, j]] in size sizes[rows[u, j], size_slots[u, j]]
+            with score scores[u, j]. Missing results have rows == -1 and a
+            NaN score. Rankings match find_best_fitting_items per user.
+        """
+        table = self._get_fit_table(garment_type)
+        n_users = len(users)
+
+        if table is None:
+            return {
+                'garment_type': garment_type,
+                'measurements': [],
+                'item_ids': np.empty(0),
+                'sizes': np.empty((0, 0), dtype=object),
+                'rows': np.full((n_users, 0), -1, dtype=np.int64),
+                'size_slots': np.full((n_users, 0), -1, dtype=np.int64),
+                'scores': np.full((n_users, 0), np.nan),
+            }
+
+        user_values, user_known = self._user_matrix(table['measurements'], users, measurements)
+
+        n_items, n_sizes = table['present'].shape
+        k = n_items if top_k is None else max(0, min(top_k, n_items))
+
+        rows = np.full((n_users, k), -1, dtype=np.int64)
+        size_slots = np.full((n_users, k), -1, dtype=np.int64)
+        scores = np.full((n_users, k), np.nan)
+
+        # Bound the (users, items, sizes, measurements) working set per chunk
+        cell_count = max(1, n_items * n_sizes * max(1, len(table['measurements'])))
+        chunk = max(1, (1 << 22) // cell_count)
+
+        for start in range(0, n_users, chunk):
+            stop = min(start + chunk, n_users)
+            chunk_scores = self._score_fit_table(table, user_values[start:stop], user_known[start:stop])
+
+            best_sizes = np.argmax(chunk_scores, axis=2)
+            best_scores = np.take_along_axis(chunk_scores, best_sizes[..., None], axis=2)[..., 0]
+            best_scores = np.where(best_scores >= min_fit_score, best_scores, -np.inf)
+
+            # Stable sort keeps catalog order between equal scores
+            top_rows = np.argsort(-best_scores, axis=1, kind='stable')[:, :k]
+            top_scores = np.take_along_axis(best_scores, top_rows, axis=1)
+            found = top_scores > -np.inf
+
+            rows[start:stop] = np.where(found, top_rows, -1)
+            size_slots[start:stop] = np.where(
+                found, np.take_along_axis(best_sizes, top_rows, axis=1), -1)
+            scores[start:stop] = np.where(found, top_scores, np.nan)
+
+        return {
+            'garment_type': garment_type,
+            'measurements': list(table['measurements']),
+            'item_ids': table['item_ids'],
+            'sizes': table['sizes'],
+            'rows': rows,
+            'size_slots': size_slots,
+            'scores': scores,
+        }
+
+    def _user_matrix(self, measurements, users, user_columns=None):
+        """Stack many users into fit-table column order"""
+        if user_columns is not None:
+            matrix = np.asarray(users, dtype=float).reshape(len(users), len(user_columns))
+            user_values = np.full((len(users), len(measurements)), np.nan)
+            for k, measurement in enumerate(measurements):
+                if measurement in user_columns:
+                    user_values[:, k] = matrix[:, user_columns.index(measurement)]
+            return user_values, ~np.isnan(user_values)
+
+        vectors = [self._user_vector(measurements, user) for user in users]
+        if not vectors:
+            return np.empty((0, len(measurements))), np.empty((0, len(measurements)), dtype=bool)
+        return np.array([v[0] for v in vectors]), np.array([v[1] for v in vectors])
+
+    def _get_fit_table(self, garment_type):
+        """
+        Dense items x sizes x key-measurements table for a garment type
+
+        Built once per garment type and cached. Items keep their order of
+        first appearance in measurement_db and sizes keep their row order, so
+        ties resolve exactly as a row-by-row scan would.
+        """
+        fit_tables = getattr(self, '_fit_tables', None)
+        if fit_tables is None:  # Pickled before the cache existed
+            fit_tables = self._fit_tables = {}
+
+        if garment_type in fit_tables:
+            return fit_tables[garment_type]
+
+        index = self._get_garment_index()
+        block = index['blocks'].get(garment_type) if index is not None else None
+
+        if block is None:
+            fit_tables[garment_type] = None
+            return None
+
+        measurements = [m for m in self._get_key_measurements(garment_type)
+                        if m in index['columns']]
+        columns = [index['columns'].index(m) for m in measurements]
+
+        start, stop, offsets = block['start'], block['stop'], block['offsets']
+        item_ids = block['item_ids']
+        item_codes = np.repeat(np.arange(len(item_ids)), np.diff(offsets))
+        size_slots = np.arange(start, stop) - offsets[item_codes]
+        n_items, n_sizes = len(item_ids), int(size_slots.max()) + 1
+
+        values = np.full((n_items, n_sizes, len(measurements)), np.nan)
+        values[item_codes, size_slots] = index['values'][start:stop, columns]
+
+        sizes = np.full((n_items, n_sizes), None, dtype=object)
+        sizes[item_codes, size_slots] = index['sizes'][start:stop]
+
+        present = np.zeros((n_items, n_sizes), dtype=bool)
+        present[item_codes, size_slots] = True
+
+        available_sizes = [
+            list(dict.fromkeys(index['sizes'][offsets[row]:offsets[row + 1]].tolist()))
+            for row in range(n_items)
+        ]
+
+        # Score bands per measurement, see _measurement_score
+        bands = [self._measurement_score_bands(m) for m in measurements]
+
+        table = {
+            'item_ids': item_ids,
+            'measurements': measurements,
+            'values': values,
+            'sizes': sizes,
+            'present': present,
+            'available_sizes': available_sizes,
+            'thresholds': np.array([b[0] for b in bands], dtype=float).reshape(len(measurements), 3),
+            'band_scores': np.array([b[1] for b in bands], dtype=float).reshape(len(measurements), 4),
+        }
+
+        fit_tables[garment_type] = table
+        return table
+
+    def _user_vector(self, measurements, user_measurements):
+        """User values in fit-table column order, plus which of them are known"""
+        user_values = np.full(len(measurements), np.nan)
+        user_known = np.zeros(len(measurements), dtype=bool)
+
+        for k, measurement in enumerate(measurements):
+            value = user_measurements.get(measurement)
+            if isinstance(value, (int, float, np.number)):
+                user_values[k] = value
+                user_known[k] = True
+
+        return user_values, user_known
+
+    def _score_fit_table(self, table, user_values, user_known):
+        """
+        Overall fit score for every item/size slot of a fit table
+
+        Same arithmetic as _calculate_fit_score: the mean of the per-measurement
+        scores over measurements known for both the user and the size. Empty
+        size slots score -inf so they never win. user_values/user_known may
+        hold one user (K,) or many (U, K); the result is (I, S) or (U, I, S).
+        """
+        user_values = user_values[..., None, None, :]
+        user_known = user_known[..., None, None, :]
+
+        values = table['values']
+        valid = ~np.isnan(values) & user_known
+
+        abs_difference = np.abs(user_values - values)
+        thresholds = table['thresholds']
+        band_scores = table['band_scores']
+        measurement_scores = np.select(
+            [abs_difference <= thresholds[:, 0],
+             abs_difference <= thresholds[:, 1],
+             abs_difference <= thresholds[:, 2]],
+            [band_scores[:, 0], band_scores[:, 1], band_scores[:, 2]],
+            band_scores[:, 3]
+        )
+
+        total_score = np.where(valid, measurement_scores, 0.0).sum(axis=-1)
+        matches = valid.sum(axis=-1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = np.where(matches > 0, total_score / matches, 0.0)
+
+        return np.where(table['present'], scores, -np.inf)
+
+    def _overall_fit_assessment(self, score):
+        """Human-readable label for an overall fit score"""
+        if score >= 0.8:
+            return "Excellent Fit"
+        elif score >= 0.6:
+            return "Good Fit"
+        elif score >= 0.4:
+            return "Fair Fit"
+        else:
+            return "Poor Fit"
+
     def _get_key_measurements(self, garment_type):
         """Get key measurements for a garment type based on your database"""
         # Based on your garment type mapping from Step 2
@@ -259,7 +873,7 @@ class SizeRecommenderV2:
                 user_val = user_measurements[measurement]
                 size_val = size_row[measurement]
 
-                if pd.notna(size_val):
+                if _notna(size_val):
                     try:
                         size_val = float(size_val)
                         difference = user_val - size_val
@@ -300,32 +914,26 @@ class SizeRecommenderV2:
 
     def _measurement_score(self, difference, measurement_type):
         """Calculate score based on difference and measurement type"""
+        thresholds, scores = self._measurement_score_bands(measurement_type)
+
+        for threshold, score in zip(thresholds, scores):
+            if difference <= threshold:
+                return score
+        return scores[-1]
+
+    def _measurement_score_bands(self, measurement_type):
+        """Tolerance thresholds and the score for each band"""
         # Different tolerances for different measurements
         if 'chest' in measurement_type:
-            if difference <= 2: return 1.0
-            elif difference <= 5: return 0.8
-            elif difference <= 8: return 0.5
-            else: return 0.2
+            return (2, 5, 8), (1.0, 0.8, 0.5, 0.2)
         elif 'waist' in measurement_type:
-            if difference <= 1: return 1.0
-            elif difference <= 3: return 0.8
-            elif difference <= 6: return 0.4
-            else: return 0.1
+            return (1, 3, 6), (1.0, 0.8, 0.4, 0.1)
         elif 'length' in measurement_type or 'sleeve' in measurement_type:
-            if difference <= 3: return 1.0
-            elif difference <= 6: return 0.7
-            elif difference <= 10: return 0.4
-            else: return 0.1
+            return (3, 6, 10), (1.0, 0.7, 0.4, 0.1)
         elif 'hips' in measurement_type:
-            if difference <= 2: return 1.0
-            elif difference <= 5: return 0.7
-            elif difference <= 8: return 0.4
-            else: return 0.1
+            return (2, 5, 8), (1.0, 0.7, 0.4, 0.1)
         else:
-            if difference <= 2: return 1.0
-            elif difference <= 5: return 0.7
-            elif difference <= 8: return 0.4
-            else: return 0.1
+            return (2, 5, 8), (1.0, 0.7, 0.4, 0.1)
 
     def _fit_assessment(self, difference, measurement_type):
         """Provide human-readable fit assessment"""
@@ -349,23 +957,69 @@ class SizeRecommenderV2:
 
 # ========== INTELLIGENT OUTFIT BUILDER (REAL LOGIC) ==========
 class IntelligentOutfitBuilder:
-    def __init__(self, items_df, item_embeddings_dict, size_recommender=None):
+    def __init__(self, items_df, item_embeddings_dict, size_recommender=None, cache_dir=None):
         """
         Intelligent outfit builder with compatibility rules
+
+        With cache_dir (default: $FITFAST_DERIVED_CACHE), item metadata, the
+        embedding index, rules and themes are kept there under a content hash of items_df and the embeddings,
+        and reused by any later builder over the same inputs.
         """
         self.items_df = items_df.copy()
         self.item_embeddings_dict = item_embeddings_dict
         self.size_recommender = size_recommender
 
+        cache_dir = cache_dir or os.environ.get(DERIVED_CACHE_ENV)
+        cache_path = None
+        if cache_dir:
+            from artifact_store import content_hash, cache_entry_path, load_artifact, is_artifact
+
+            key = content_hash('outfit_builder', DERIVED_CACHE_VERSION, items_df, item_embeddings_dict)
+            cache_path = cache_entry_path(cache_dir, 'outfit_builder', key)
+            if is_artifact(cache_path):
+                self._restore_derived(*load_artifact(cache_path, 'outfit_builder'))
+                return
+
         # Build item metadata
         self.item_metadata = self._build_item_metadata()
 
+        # Embedding matrix for similarity search
+        self._embedding_index = self._build_embedding_index()
+        self.ann_index = None
+
+        # Outfit candidates by (category, formality), sorted by price
+        self._candidate_index = self._build_candidate_index()
+
         # Define outfit compatibility rules
         self.compatibility_rules = self._define_compatibility_rules()
+        self._compiled_rules = None
 
         # Define style themes
         self.style_themes = self._define_style_themes()
 
+        if cache_path:
+            self._write_derived_cache(cache_path)
+
+    def _write_derived_cache(self, cache_path):
+        """Publish derived state as a cache entry; a cache that cannot be written is skipped"""
+        from artifact_store import publish_artifact
+
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            publish_artifact(cache_path, lambda path: self.save_artifact(path, include_size_recommender=False))
+        except (OSError, TypeError, ValueError):
+            # The data is already built in memory; only the cache entry is lost
+            pass
+
+    def __getstate__(self):
+        """Search indexes are rebuilt or loaded separately, keep them out of pickles"""
+        state = self.__dict__.copy()
+        state.pop('_embedding_index', None)
+        state.pop('_candidate_index', None)
+        state.pop('_compiled_rules', None)
+        state.pop('ann_index', None)
+        return state
+
     def _build_item_metadata(self):
         """Build comprehensive item metadata"""
         metadata = {}
@@ -525,48 +1179,135 @@ class IntelligentOutfitBuilder:
             }
         }
 
-    def find_similar_items(self, item_id, n=5, same_category=True, min_similarity=0.0):
-        """Find similar items using embeddings"""
-        if item_id not in self.item_embeddings_dict:
+    def _build_embedding_index(self):
+        """
+        Contiguous embedding matrix for similarity search
+
+        Rows follow item_embeddings_dict order and are scaled to unit
+        length in float64, so similarities stay within rounding of the exact
+        cosine instead of picking up a float32 error per row. The original
+        norms are kept so cosine similarity keeps its 1e-8 smoothing. Each
+        row also carries its garment category as a code.
+        """
+        item_ids = list(self.item_embeddings_dict.keys())
+        if item_ids:
+            matrix = np.asarray([np.ravel(self.item_embeddings_dict[i]) for i in item_ids], dtype=np.float64)
+        else:
+            matrix = np.empty((0, 0))
+
+        norms = np.linalg.norm(matrix, axis=1) if len(matrix) else np.empty(0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            unit = np.where(norms[:, None] > 0, matrix / norms[:, None], 0)
+
+        categories = [self.item_metadata[i]['garment_category'] if i in self.item_metadata else None
+                      for i in item_ids]
+        category_codes, category_values = _factorize(categories)
+
+        return {
+            'item_ids': item_ids,
+            'rows': {item_id: row for row, item_id in enumerate(item_ids)},
+            'unit': np.ascontiguousarray(unit),
+            'norms': norms,
+            'category_codes': category_codes,
+            'category_values': category_values,
+        }
+
+    def _get_embedding_index(self):
+        """Embedding matrix, built on first use for older pickles"""
+        if getattr(self, '_embedding_index', None) is None:
+            self._embedding_index = self._build_embedding_index()
+        return self._embedding_index
+
+    def build_ann_index(self, n_lists=None, nprobe=8, **kwargs):
+        """Build an approximate index over the embeddings, one partition per category"""
+        from ann_index import IVFIndex
+
+        index = self._get_embedding_index()
+        self.ann_index = IVFIndex.build(index['unit'], index['category_codes'],
+                                        n_lists=n_lists, nprobe=nprobe, **kwargs)
+        return self.ann_index
+
+    def save_ann_index(self, filepath):
+        """Save the approximate index built by build_ann_index"""
+        self.ann_index.save(filepath)
+
+    def load_ann_index(self, filepath):
+        """Load an approximate index saved for these same embeddings"""
+        from ann_index import IVFIndex
+
+        ann_index = IVFIndex.load(filepath)
+        if ann_index.n_rows != len(self._get_embedding_index()['item_ids']):
+            raise ValueError("ANN index was built for a different set of embeddings")
+
+        self.ann_index = ann_index
+        return ann_index
+
+    def find_similar_items(self, item_id, n=5, same_category=True, min_similarity=0.0,
+                           exact=False, nprobe=None):
+        """
+        Find similar items using embeddings
+
+        Uses the approximate index when one is attached (see build_ann_index)
+        unless exact=True; nprobe trades recall for latency on that path.
+        """
+        index = self._get_embedding_index()
+        row = index['rows'].get(item_id)
+        if row is None:
             return []
 
-        target_embedding = self.item_embeddings_dict[item_id]
-        similarities = []
+        target_category = index['category_codes'][row]
+        ann_index = getattr(self, 'ann_index', None)
 
-        for other_id, other_embedding in self.item_embeddings_dict.items():
-            if other_id == item_id:
-                continue
+        if ann_index is not None and not exact:
+            rows = np.sort(ann_index.candidates(index['unit'][row],
+                                                target_category if same_category else None, nprobe))
+        else:
+            rows = np.arange(len(index['item_ids']))
 
-            # Filter by category if requested
-            if same_category:
-                target_category = self.item_metadata[item_id]['garment_category']
-                other_category = self.item_metadata[other_id]['garment_category']
-                if target_category != other_category:
-                    continue
+        # Cosine similarity against the candidates in one matrix-vector product
+        norm_products = index['norms'][row] * index['norms'][rows]
+        similarities = (index['unit'][rows] @ index['unit'][row]) * (
+            norm_products / (norm_products + 1e-8))
 
-            # Calculate cosine similarity
-            cos_sim = np.dot(target_embedding, other_embedding) / (
-                np.linalg.norm(target_embedding) * np.linalg.norm(other_embedding) + 1e-8
-            )
+        mask = (similarities >= min_similarity) & (rows != row)
+
+        # Filter by category if requested
+        if same_category:
+            mask &= index['category_codes'][rows] == target_category
 
-            if cos_sim >= min_similarity:
-                similarities.append({
-                    'item_id': other_id,
-                    'similarity': float(cos_sim),
-                    'name': self.item_metadata[other_id]['name'],
-                    'garment_type': self.item_metadata[other_id]['garment_type'],
-                    'garment_category': self.item_metadata[other_id]['garment_category'],
-                    'price': self.item_metadata[other_id]['price']
-                })
+        top = _select_top_rows(similarities, np.flatnonzero(mask), n)
 
-        # Sort by similarity
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
-        return similarities[:n]
+        results = []
+        for position in top:
+            other_id = index['item_ids'][rows[position]]
+            metadata = self.item_metadata[other_id]
+            results.append({
+                'item_id': other_id,
+                'similarity': float(similarities[position]),
+                'name': metadata['name'],
+                'garment_type': metadata['garment_type'],
+                'garment_category': metadata['garment_category'],
+                'price': metadata['price']
+            })
+
+        return results
 
     def build_outfit(self, starting_item_id, user_measurements=None,
                     style_theme='casual_everyday', max_items=4,
-                    max_price=None, require_size_fit=True):
-        """Build a complete outfit"""
+                    max_price=None, require_size_fit=True,
+                    search='greedy', beam_width=3, time_budget_ms=None, max_nodes=None,
+                    size_cache=None, pool_cache=None):
+        """
+        Build a complete outfit
+
+        search='greedy' takes the most compatible item for each category in
+        turn. search='beam' keeps the beam_width best partial outfits per
+        step, ranked by compatibility plus style coherence, and also keeps
+        the whole outfit within max_price. time_budget_ms / max_nodes bound
+        the beam search; once spent, the best partial outfit is finished
+        greedily. size_cache / pool_cache are request-scoped dicts that let
+        several outfits for the same request share size fits and candidates.
+        """
         if starting_item_id not in self.item_metadata:
             return None
 
@@ -575,43 +1316,36 @@ class IntelligentOutfitBuilder:
         # Get style theme configuration
         theme_config = self.style_themes.get(style_theme, self.style_themes['casual_everyday'])
 
-        # Initialize outfit
-        outfit_items = [starting_item]
-        total_price = starting_item['price']
-        size_recommendations = {}
-
-        # Get size recommendation for starting item
-        if user_measurements and self.size_recommender and require_size_fit:
-            size_rec = self._get_size_recommendation(starting_item, user_measurements)
-            if size_rec:
-                size_recommendations[starting_item_id] = size_rec
-
         # Find compatible items for other categories
         target_categories = theme_config['categories'].copy()
         target_categories.remove(starting_item['garment_category'])  # Remove starting category
 
-        for category in target_categories[:max_items-1]:
-            if len(outfit_items) >= max_items:
-                break
+        max_price_per_item = max_price/len(target_categories) if max_price else None
+        steps = target_categories[:max_items-1]
 
-            # Find compatible items in this category
-            compatible_items = self._find_compatible_items(
-                outfit_items,
-                category,
-                theme_config['formality'],
-                max_price_per_item=max_price/len(target_categories) if max_price else None
+        if search == 'beam':
+            outfit_items = self._beam_search_outfit(
+                starting_item, steps, theme_config, style_theme, max_price, max_price_per_item,
+                beam_width, time_budget_ms, max_nodes, pool_cache
+            )
+        else:
+            outfit_items = self._complete_greedily(
+                [starting_item], steps, theme_config, max_price_per_item, pool_cache
             )
 
-            if compatible_items:
-                best_item = compatible_items[0]
-                outfit_items.append(best_item)
-                total_price += best_item['price']
+        total_price = starting_item['price']
+        for item in outfit_items[1:]:
+            total_price += item['price']
 
-                # Get size recommendation if needed
-                if user_measurements and self.size_recommender and require_size_fit:
-                    size_rec = self._get_size_recommendation(best_item, user_measurements)
-                    if size_rec:
-                        size_recommendations[best_item['id']] = size_rec
+        # Get size recommendations if needed
+        size_recommendations = {}
+        if size_cache is None:
+            size_cache = {}
+        if user_measurements and self.size_recommender and require_size_fit:
+            for item in outfit_items:
+                size_rec = self._get_size_recommendation(item, user_measurements, size_cache)
+                if size_rec:
+                    size_recommendations[item['id']] = size_rec
 
         # Calculate outfit metrics
         compatibility_score = self._calculate_outfit_compatibility(outfit_items)
@@ -629,122 +1363,354 @@ class IntelligentOutfitBuilder:
             'description': theme_config['description']
         }
 
-    def _find_compatible_items(self, current_outfit, target_category,
-                              allowed_formalities, max_price_per_item=None):
-        """Find items compatible with current outfit"""
-        compatible_items = []
+    def _complete_greedily(self, outfit_items, categories, theme_config, max_price_per_item,
+                           pool_cache=None):
+        """Add the most compatible item of each remaining category"""
+        outfit_items = list(outfit_items)
 
-        for item_id, metadata in self.item_metadata.items():
-            # Skip if already in outfit
-            if any(existing['id'] == item_id for existing in current_outfit):
-                continue
+        for category in categories:
+            # Find compatible items in this category
+            compatible_items = self._find_compatible_items(
+                outfit_items,
+                category,
+                theme_config['formality'],
+                max_price_per_item=max_price_per_item,
+                pool_cache=pool_cache
+            )
 
-            # Check category match
-            if metadata['garment_category'] != target_category:
-                continue
+            if compatible_items:
+                outfit_items.append(compatible_items[0])
 
-            # Check formality compatibility
-            if metadata['formality'] not in allowed_formalities:
-                continue
+        return outfit_items
+
+    def _beam_search_outfit(self, starting_item, categories, theme_config, style_theme,
+                            max_price, max_price_per_item, beam_width, time_budget_ms, max_nodes,
+                            pool_cache=None):
+        """
+        Keep the best beam_width partial outfits at every category step
+
+        Each partial outfit carries its summed pairwise compatibility points,
+        so a child only scores its new item against the parent's items, in
+        one vectorized lookup per parent. A category with no candidate that
+        fits leaves the outfit unchanged, as in greedy mode.
+        """
+        rules = self._get_compiled_rules()
+        deadline = time.perf_counter() + time_budget_ms / 1000 if time_budget_ms else None
+        nodes = 0
+
+        # (items, total price, summed pair points, rank score)
+        start_score = self._calculate_style_coherence([starting_item], style_theme)
+        beams = [([starting_item], starting_item['price'], 0, start_score)]
+
+        for step, category in enumerate(categories):
+            out_of_time = deadline is not None and time.perf_counter() > deadline
+            if out_of_time or (max_nodes and nodes >= max_nodes):
+                return self._complete_greedily(
+                    beams[0][0], categories[step:], theme_config, max_price_per_item, pool_cache
+                )
+
+            children = []
+            seen = set()
+
+            for items, total_price, pair_points, score in beams:
+                candidates = self._find_compatible_items(
+                    items, category, theme_config['formality'],
+                    max_price_per_item=max_price_per_item, limit=beam_width, pool_cache=pool_cache
+                )
+                if max_price:
+                    candidates = [c for c in candidates if total_price + c['price'] <= max_price]
+
+                if not candidates:
+                    key = frozenset(item['id'] for item in items)
+                    if key not in seen:
+                        seen.add(key)
+                        children.append((items, total_price, pair_points, score))
+                    continue
+
+                # Pair points of each candidate (as the later item) with the parent's items
+                new_categories, new_formalities, _ = self._encode_items(candidates)
+                old_categories, old_formalities, _ = self._encode_items(items)
+                added_points = (
+                    rules['category_scores'][new_categories[:, None], old_categories[None, :]]
+                    + rules['formality_scores'][new_formalities[:, None], old_formalities[None, :]]
+                ).sum(axis=1).tolist()
+
+                comparisons = len(items) * (len(items) + 1) // 2
+
+                for candidate, points in zip(candidates, added_points):
+                    child = items + [candidate]
+                    key = frozenset(item['id'] for item in child)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+
+                    child_points = pair_points + points
+                    child_score = (min(100, child_points / comparisons)
+                                   + self._calculate_style_coherence(child, style_theme))
+                    children.append((child, total_price + candidate['price'], child_points, child_score))
+                    nodes += 1
+
+            # Stable sort keeps the earlier (greedier) outfit on ties
+            beams = sorted(children, key=lambda beam: beam[3], reverse=True)[:max(1, beam_width)]
+
+        return beams[0][0]
+
+    def _build_candidate_index(self):
+        """
+        Inverted index of outfit candidates
+
+        Keyed by (garment_category, formality). Each entry holds the item
+        positions in item_metadata order, sorted by price, with the matching
+        prices, so a price cap is a binary search. Items without a price
+        sort last and are never capped, as before.
+        """
+        item_ids = list(self.item_metadata.keys())
+        items = list(self.item_metadata.values())
+
+        keys = [(item['garment_category'], item['formality']) for item in items]
+        prices = np.array([item['price'] for item in items], dtype=float)
+        key_codes, key_values = _factorize(keys)
+
+        lists = {}
+        for code, key in enumerate(key_values):
+            positions = np.flatnonzero(key_codes == code)
+            order = np.argsort(prices[positions], kind='stable')
+            lists[key] = {
+                'positions': positions[order],
+                'prices': prices[positions][order],
+                'priced': int(np.count_nonzero(~np.isnan(prices[positions])))
+            }
+
+        return {
+            'item_ids': item_ids,
+            'items': items,
+            'positions_by_id': {item_id: position for position, item_id in enumerate(item_ids)},
+            'lists': lists
+        }
+
+    def _get_candidate_index(self):
+        """Candidate index, built on first use for older pickles"""
+        if getattr(self, '_candidate_index', None) is None:
+            self._candidate_index = self._build_candidate_index()
+        return self._candidate_index
+
+    def _candidate_positions(self, target_category, allowed_formalities, max_price_per_item=None):
+        """item_metadata positions in a category, formality set and price cap"""
+        index = self._get_candidate_index()
+        blocks = []
 
-            # Check price limit
-            if max_price_per_item and metadata['price'] > max_price_per_item:
+        for formality in dict.fromkeys(allowed_formalities):
+            entry = index['lists'].get((target_category, formality))
+            if entry is None:
                 continue
 
-            # Calculate compatibility with all items in current outfit
-            item_compatibility = self._calculate_item_compatibility(metadata, current_outfit)
+            if max_price_per_item:
+                stop = np.searchsorted(entry['prices'][:entry['priced']], max_price_per_item, side='right')
+                blocks.append(entry['positions'][:stop])
+                blocks.append(entry['positions'][entry['priced']:])
+            else:
+                blocks.append(entry['positions'])
 
-            if item_compatibility > 0:
-                compatible_items.append((item_id, metadata, item_compatibility))
+        if not blocks:
+            return np.empty(0, dtype=np.int64)
 
-        # Sort by compatibility score
-        compatible_items.sort(key=lambda x: x[2], reverse=True)
+        # Back to catalog order so ties rank as they always have
+        return np.sort(np.concatenate(blocks))
+
+    def _find_compatible_items(self, current_outfit, target_category,
+                              allowed_formalities, max_price_per_item=None, limit=5,
+                              pool_cache=None):
+        """
+        Find items compatible with current outfit
+
+        pool_cache, when given, memoizes candidate pools per (category,
+        formalities, price cap) and ranked results per outfit, so themes
+        built for the same request scan each pool once.
+        """
+        if not current_outfit:
+            return []
+
+        formalities = tuple(allowed_formalities)
+        result_key = None
+        if pool_cache is not None:
+            result_key = ('ranked', tuple(item['id'] for item in current_outfit),
+                          target_category, formalities, max_price_per_item, limit)
+            if result_key in pool_cache:
+                return list(pool_cache[result_key])
+
+        index = self._get_candidate_index()
+        rules = self._get_compiled_rules()
+
+        pool_key = ('pool', target_category, formalities, max_price_per_item)
+        if pool_cache is not None and pool_key in pool_cache:
+            positions = pool_cache[pool_key]
+        else:
+            positions = self._candidate_positions(target_category, formalities, max_price_per_item)
+            if pool_cache is not None:
+                pool_cache[pool_key] = positions
+
+        # Skip items already in the outfit
+        in_outfit = [index['positions_by_id'][existing['id']] for existing in current_outfit
+                     if existing['id'] in index['positions_by_id']]
+        if in_outfit:
+            positions = positions[~np.isin(positions, in_outfit)]
+
+        # Compatibility of the whole pool with the current outfit at once
+        scores = self._score_candidates(
+            rules['item_categories'][positions],
+            rules['item_formalities'][positions],
+            rules['item_prices'][positions],
+            current_outfit
+        )
+
+        # Top 5 (or limit) by compatibility score
+        top = _select_top_rows(scores, np.flatnonzero(scores > 0), limit)
+        compatible = [index['items'][positions[row]] for row in top]
+
+        if result_key is not None:
+            pool_cache[result_key] = compatible
+        return list(compatible)
+
+    def _compile_compatibility_rules(self):
+        """
+        Integer-coded compatibility rules
+
+        Categories and formalities become small integer codes and the rule
+        lists become score matrices: category_scores[new, existing] is 30
+        for a compatible pair and formality_scores[existing, new] is 20.
+        The last code of each table stands for values the rules never
+        mention. Per-item codes and prices follow item_metadata order.
+        """
+        category_rules = self.compatibility_rules['category_compatibility']
+        formality_rules = self.compatibility_rules['formality_compatibility']
+        items = list(self.item_metadata.values())
+
+        categories = list(dict.fromkeys(
+            list(category_rules) + [c for compatible in category_rules.values() for c in compatible]
+            + [item['garment_category'] for item in items]))
+        formalities = list(dict.fromkeys(
+            list(formality_rules) + [f for compatible in formality_rules.values() for f in compatible]
+            + [item['formality'] for item in items]))
+
+        category_codes = {category: code for code, category in enumerate(categories)}
+        formality_codes = {formality: code for code, formality in enumerate(formalities)}
+
+        category_scores = np.zeros((len(categories) + 1, len(categories) + 1), dtype=np.int64)
+        for new_category, compatible in category_rules.items():
+            for existing_category in compatible:
+                category_scores[category_codes[new_category], category_codes[existing_category]] = 30
+
+        formality_scores = np.zeros((len(formalities) + 1, len(formalities) + 1), dtype=np.int64)
+        for existing_formality, compatible in formality_rules.items():
+            for new_formality in compatible:
+                formality_scores[formality_codes[existing_formality], formality_codes[new_formality]] = 20
+
+        compiled = {
+            'category_codes': category_codes,
+            'formality_codes': formality_codes,
+            'category_scores': category_scores,
+            'formality_scores': formality_scores,
+        }
+        compiled['item_categories'], compiled['item_formalities'], compiled['item_prices'] = (
+            self._encode_items(items, compiled))
+        return compiled
+
+    def _get_compiled_rules(self):
+        """Compiled compatibility rules, built on first use"""
+        if getattr(self, '_compiled_rules', None) is None:
+            self._compiled_rules = self._compile_compatibility_rules()
+        return self._compiled_rules
+
+    def _encode_items(self, items, compiled=None):
+        """Category codes, formality codes and prices for item dicts"""
+        compiled = compiled or self._get_compiled_rules()
+        category_codes, formality_codes = compiled['category_codes'], compiled['formality_codes']
+        unknown_category, unknown_formality = len(category_codes), len(formality_codes)
+
+        return (
+            np.array([category_codes.get(item['garment_category'], unknown_category) for item in items],
+                     dtype=np.int64),
+            np.array([formality_codes.get(item['formality'], unknown_formality) for item in items],
+                     dtype=np.int64),
+            np.array([item['price'] for item in items], dtype=float)
+        )
+
+    def _score_candidates(self, categories, formalities, prices, existing_items):
+        """
+        Compatibility of every candidate with the current outfit
 
-        # Return just the metadata
-        return [item[1] for item in compatible_items[:5]]  # Top 5
+        Vectorized _calculate_item_compatibility: the same 30/20/10 points
+        per existing item, summed as integers and divided by the outfit size.
+        """
+        rules = self._get_compiled_rules()
+        existing_categories, existing_formalities, existing_prices = self._encode_items(existing_items)
+
+        new_prices = prices[:, None]
+        existing_prices = existing_prices[None, :]
+
+        # Price harmony (items within 3x price range), with max()/min() semantics
+        high = np.where(existing_prices > new_prices, existing_prices, new_prices)
+        low = np.where(existing_prices < new_prices, existing_prices, new_prices)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            price_harmony = np.where(high / (low + 1e-8) < 3, 10, 0)
+
+        totals = (rules['category_scores'][categories[:, None], existing_categories[None, :]]
+                  + rules['formality_scores'][existing_formalities[None, :], formalities[:, None]]
+                  + price_harmony).sum(axis=1)
+
+        return totals / len(existing_items)
 
     def _calculate_item_compatibility(self, new_item, existing_items):
         """Calculate compatibility score for a new item with existing outfit"""
         if not existing_items:
             return 0
 
-        compatibility_score = 0
-
-        for existing_item in existing_items:
-            # Category compatibility
-            if existing_item['garment_category'] in self.compatibility_rules['category_compatibility'].get(
-                new_item['garment_category'], []
-            ):
-                compatibility_score += 30
-
-            # Formality compatibility
-            if new_item['formality'] in self.compatibility_rules['formality_compatibility'].get(
-                existing_item['formality'], []
-            ):
-                compatibility_score += 20
-
-            # Price harmony (items within 3x price range)
-            price_ratio = max(new_item['price'], existing_item['price']) / (
-                min(new_item['price'], existing_item['price']) + 1e-8
-            )
-            if price_ratio < 3:
-                compatibility_score += 10
+        categories, formalities, prices = self._encode_items([new_item])
+        return float(self._score_candidates(categories, formalities, prices, existing_items)[0])
 
-        return compatibility_score / len(existing_items)
+    def _get_size_recommendation(self, item, user_measurements, size_cache=None):
+        """
+        Get size recommendation for an item
 
-    def _get_size_recommendation(self, item, user_measurements):
-        """Get size recommendation for an item"""
+        Scores only this item's sizes. Results are memoized in size_cache,
+        keyed by (measurement fingerprint, item id), for the current request.
+        """
         if not self.size_recommender or not user_measurements:
             return None
 
         try:
-            garment_type = item['garment_type']
-            if garment_type == 'unknown':
-                return None
+            cache_key = (self._measurement_fingerprint(user_measurements), item['id'])
+            if size_cache is not None and cache_key in size_cache:
+                return size_cache[cache_key]
 
-            # Use size recommender
-            recommendations = self.size_recommender.find_best_fitting_items(
-                user_measurements, garment_type, top_k=1
-            )
+            recommendation = self.size_recommender.recommend_size_for_item(item['id'], user_measurements)
+            size = recommendation['recommended_size'] if recommendation else None
 
-            if recommendations:
-                return recommendations[0]['recommended_size']
+            if size_cache is not None:
+                size_cache[cache_key] = size
+            return size
         except Exception as e:
             return None
 
-        return None
+    @staticmethod
+    def _measurement_fingerprint(user_measurements):
+        """Hashable, order-independent key for a measurement dict"""
+        return json.dumps(user_measurements, sort_keys=True, default=str)
 
     def _calculate_outfit_compatibility(self, outfit_items):
         """Calculate overall outfit compatibility score"""
         if len(outfit_items) < 2:
             return 0
 
-        total_score = 0
-        comparisons = 0
-
-        for i in range(len(outfit_items)):
-            for j in range(i + 1, len(outfit_items)):
-                item1 = outfit_items[i]
-                item2 = outfit_items[j]
-
-                # Category compatibility
-                if item1['garment_category'] in self.compatibility_rules['category_compatibility'].get(
-                    item2['garment_category'], []
-                ):
-                    total_score += 30
+        rules = self._get_compiled_rules()
+        categories, formalities, _ = self._encode_items(outfit_items)
 
-                # Formality compatibility
-                if item1['formality'] in self.compatibility_rules['formality_compatibility'].get(
-                    item2['formality'], []
-                ):
-                    total_score += 20
+        # Every pair (i, j) with i < j, scored against item j's rules
+        first, second = np.triu_indices(len(outfit_items), k=1)
+        total_score = int(rules['category_scores'][categories[second], categories[first]].sum()
+                          + rules['formality_scores'][formalities[second], formalities[first]].sum())
 
-                comparisons += 1
-
-        if comparisons == 0:
-            return 0
-
-        return min(100, total_score / comparisons)
+        return min(100, total_score / len(first))
 
     def _calculate_style_coherence(self, outfit_items, style_theme):
         """Calculate how well the outfit matches the style theme"""
@@ -779,27 +1745,133 @@ class IntelligentOutfitBuilder:
         return min(100, score)
 
     def generate_multiple_outfits(self, starting_item_id, user_measurements=None,
-                                 n_outfits=3, max_price_per_outfit=None):
-        """Generate multiple outfit options"""
-        outfits = []
-        style_themes = list(self.style_themes.keys())
-
-        for i in range(min(n_outfits, len(style_themes))):
-            theme = style_themes[i]
-            outfit = self.build_outfit(
+                                 n_outfits=3, max_price_per_outfit=None, workers=None,
+                                 **build_options):
+        """
+        Generate multiple outfit options
+
+        All themes share one request's candidate pools and size fits, so a
+        category such as 'top' is scanned and sized once. With workers > 1
+        the themes are built on a thread pool; the result is the same as
+        building them one after another.
+
+        Args:
+            workers: threads used to build themes in parallel (None = sequential)
+            build_options: passed to build_outfit (e.g. search='beam')
+        """
+        style_themes = list(self.style_themes.keys())[:max(0, n_outfits)]
+        size_cache = {}
+        pool_cache = {}
+
+        def build(theme):
+            return self.build_outfit(
                 starting_item_id,
                 user_measurements,
                 style_theme=theme,
-                max_price=max_price_per_outfit
+                max_price=max_price_per_outfit,
+                size_cache=size_cache,
+                pool_cache=pool_cache,
+                **build_options
             )
 
-            if outfit:
-                outfits.append(outfit)
+        if workers and workers > 1 and len(style_themes) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            # Build shared indexes up front instead of racing to build them per thread
+            self._get_candidate_index()
+            self._get_compiled_rules()
+            with ThreadPoolExecutor(max_workers=min(workers, len(style_themes))) as pool:
+                results = list(pool.map(build, style_themes))
+        else:
+            results = [build(theme) for theme in style_themes]
+
+        outfits = [outfit for outfit in results if outfit]
 
         # Sort by compatibility score
         outfits.sort(key=lambda x: x['compatibility_score'], reverse=True)
         return outfits
 
+    def save_artifact(self, path, include_size_recommender=True):
+        """
+        Write the builder as a memory-mappable artifact directory
+
+        Embeddings (raw and unit-length) and item metadata columns are .npy
+        arrays, rules and themes are JSON and the size recommender is a
+        nested artifact. items_df is only needed to build item_metadata and
+        is not stored.
+        """
+        from artifact_store import save_artifact, id_array, records_to_columns, encode_meta
+
+        index = self._get_embedding_index()
+        if index['item_ids']:
+            embeddings = np.asarray([np.ravel(self.item_embeddings_dict[i]) for i in index['item_ids']])
+        else:
+            embeddings = np.empty((0, 0))
+
+        arrays, fields = records_to_columns(list(self.item_metadata.values()), 'item_field_')
+        arrays.update({
+            'embedding_ids': id_array(index['item_ids']),
+            'embeddings': embeddings,
+            'embedding_unit': index['unit'],
+            'embedding_norms': index['norms'],
+            'embedding_category_codes': index['category_codes'],
+        })
+
+        meta = {
+            'item_fields': fields,
+            'category_values': encode_meta(index['category_values']),
+            'compatibility_rules': encode_meta(self.compatibility_rules),
+            'style_themes': encode_meta(self.style_themes),
+        }
+
+        save_artifact(path, 'outfit_builder', arrays, meta)
+
+        if include_size_recommender and self.size_recommender is not None:
+            self.size_recommender.save_artifact(os.path.join(path, 'size_recommender'))
+
+    @classmethod
+    def load_artifact(cls, path, mmap=True):
+        """Open a save_artifact() directory; embeddings stay memory-mapped"""
+        from artifact_store import load_artifact, is_artifact
+
+        arrays, meta = load_artifact(path, 'outfit_builder', mmap=mmap)
+
+        builder = cls.__new__(cls)
+        builder.items_df = None
+
+        item_ids = arrays['embedding_ids'].tolist()
+        embeddings = arrays['embeddings']
+        builder.item_embeddings_dict = {item_id: embeddings[row] for row, item_id in enumerate(item_ids)}
+
+        size_path = os.path.join(path, 'size_recommender')
+        builder.size_recommender = SizeRecommenderV2.load_artifact(size_path, mmap) if is_artifact(size_path) else None
+
+        builder._restore_derived(arrays, meta)
+        return builder
+
+    def _restore_derived(self, arrays, meta):
+        """Set item metadata, the embedding index, rules and themes from artifact arrays"""
+        from artifact_store import columns_to_records, decode_meta
+
+        records = columns_to_records(arrays, meta['item_fields'], 'item_field_')
+        self.item_metadata = {record['id']: record for record in records}
+
+        item_ids = arrays['embedding_ids'].tolist()
+        self._embedding_index = {
+            'item_ids': item_ids,
+            'rows': {item_id: row for row, item_id in enumerate(item_ids)},
+            'unit': arrays['embedding_unit'],
+            'norms': arrays['embedding_norms'],
+            'category_codes': arrays['embedding_category_codes'],
+            'category_values': decode_meta(meta['category_values']),
+        }
+        self.ann_index = None
+        self._candidate_index = None
+
+        self.compatibility_rules = decode_meta(meta['compatibility_rules'])
+        self._compiled_rules = None
+        self.style_themes = decode_meta(meta['style_themes'])
+
     def save_model(self, filepath):
         """Save the outfit builder model"""
         with open(filepath, 'wb') as f:
@@ -816,4 +1888,4 @@ class IntelligentOutfitBuilder:
             return None
 
 # Export classes
-__all__ = ['SizeRecommenderV2', 'IntelligentOutfitBuilder']
\ No newline at end of file
+__all__ = ['ItemCatalog', 'SizeRecommenderV2', 'IntelligentOutfitBuilder']
\ No newline at end of file
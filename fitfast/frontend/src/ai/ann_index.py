@@ -0,0 +1,177 @@
+# ann_index.py - APPROXIMATE NEAREST NEIGHBOURS FOR ITEM EMBEDDINGS
+import json
+import numpy as np
+
+ANN_FORMAT_VERSION = 1
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) index over unit-length embeddings
+
+    Every category is clustered on its own with spherical k-means, so each
+    inverted list holds items of a single category. A category-filtered
+    query only ever probes that category's lists. Lists are stored as one
+    permuted row array plus offsets (CSR), so probing a list is a slice.
+
+    Recall/latency is tuned with `nprobe`, the number of lists scanned per
+    query. Candidates from the probed lists are scored exactly.
+    """
+
+    def __init__(self, centroids, list_offsets, list_rows, list_categories, n_rows, nprobe=8):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.list_categories = list_categories
+        self.n_rows = n_rows
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, unit_matrix, category_codes=None, n_lists=None, nprobe=8,
+              n_iter=10, train_size=50000, seed=0):
+        """
+        Cluster unit_matrix rows into inverted lists
+
+        Args:
+            unit_matrix: (n_items, dim) unit-length embeddings
+            category_codes: per-row integer category, None for one partition
+            n_lists: lists per category, default about sqrt(category size)
+            nprobe: default number of lists probed per query
+            n_iter: k-means iterations
+            train_size: max rows per category used to train the centroids
+            seed: random seed for reproducible builds
+        """
+        unit_matrix = np.asarray(unit_matrix)
+        n_rows = len(unit_matrix)
+        if category_codes is None:
+            category_codes = np.zeros(n_rows, dtype=np.int64)
+        category_codes = np.asarray(category_codes)
+
+        rng = np.random.default_rng(seed)
+        centroids, list_rows, list_sizes, list_categories = [], [], [], []
+
+        for category in np.unique(category_codes):
+            rows = np.flatnonzero(category_codes == category)
+            vectors = unit_matrix[rows]
+
+            count = n_lists or max(1, int(round(np.sqrt(len(rows)))))
+            count = min(count, len(rows))
+
+            sample = vectors
+            if len(rows) > train_size:
+                sample = vectors[rng.choice(len(rows), train_size, replace=False)]
+
+            category_centroids = _spherical_kmeans(sample, count, n_iter, rng)
+            assignment = _nearest_centroid(vectors, category_centroids)
+
+            order = np.argsort(assignment, kind='stable')
+            sizes = np.bincount(assignment, minlength=count)
+
+            centroids.append(category_centroids)
+            list_rows.append(rows[order])
+            list_sizes.append(sizes)
+            list_categories.append(np.full(count, category, dtype=np.int64))
+
+        dim = unit_matrix.shape[1] if unit_matrix.ndim == 2 else 0
+        if not centroids:
+            return cls(np.empty((0, dim), dtype=unit_matrix.dtype), np.zeros(1, dtype=np.int64),
+                       np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), n_rows, nprobe)
+
+        list_sizes = np.concatenate(list_sizes)
+        return cls(
+            np.ascontiguousarray(np.concatenate(centroids), dtype=unit_matrix.dtype),
+            np.concatenate([[0], np.cumsum(list_sizes)]).astype(np.int64),
+            np.concatenate(list_rows).astype(np.int64),
+            np.concatenate(list_categories),
+            n_rows,
+            nprobe
+        )
+
+    def candidates(self, query, category=None, nprobe=None):
+        """Rows of the lists closest to `query`, optionally in one category"""
+        nprobe = nprobe or self.nprobe
+        scores = self.centroids @ query
+
+        if category is not None:
+            lists = np.flatnonzero(self.list_categories == category)
+            scores = scores[lists]
+        else:
+            lists = np.arange(len(scores))
+
+        if len(lists) > nprobe:
+            lists = lists[np.argpartition(-scores, nprobe - 1)[:nprobe]]
+
+        starts, stops = self.list_offsets[lists], self.list_offsets[lists + 1]
+        if not len(lists):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.list_rows[a:b] for a, b in zip(starts, stops)])
+
+    def search(self, unit_matrix, query, k=10, category=None, nprobe=None):
+        """Approximate top-k rows by inner product, best first"""
+        rows = self.candidates(query, category, nprobe)
+        scores = unit_matrix[rows] @ query
+
+        if len(rows) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[keep], scores[keep]
+
+        order = np.lexsort((rows, -scores))
+        return rows[order], scores[order]
+
+    def save(self, path):
+        """Write the index to a single .npz file"""
+        meta = {'version': ANN_FORMAT_VERSION, 'n_rows': int(self.n_rows), 'nprobe': int(self.nprobe)}
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                meta=np.array(json.dumps(meta)),
+                centroids=self.centroids,
+                list_offsets=self.list_offsets,
+                list_rows=self.list_rows,
+                list_categories=self.list_categories
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save()"""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != ANN_FORMAT_VERSION:
+                raise ValueError(f"Unsupported ANN index version: {meta.get('version')}")
+
+            return cls(
+                data['centroids'],
+                data['list_offsets'],
+                data['list_rows'],
+                data['list_categories'],
+                meta['n_rows'],
+                meta['nprobe']
+            )
+
+
+def _nearest_centroid(vectors, centroids, chunk=65536):
+    """Index of the highest inner-product centroid for every vector"""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk):
+        assignment[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return assignment
+
+
+def _spherical_kmeans(vectors, count, n_iter, rng):
+    """k-means on the unit sphere (cosine distance)"""
+    centroids = vectors[rng.choice(len(vectors), count, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignment = _nearest_centroid(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        # Empty lists restart from a random vector
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms[empty] = np.linalg.norm(sums[empty], axis=1)
+
+        centroids = sums / np.where(norms > 0, norms, 1)[:, None]
+
+    return centroids.astype(vectors.dtype)
@@ -0,0 +1,312 @@
+# artifact_store.py - VERSIONED, MEMORY-MAPPABLE MODEL ARTIFACTS
+#
+# An artifact is a directory:
+#
+#   manifest.json      format name, version, kind, array list, JSON metadata
+#   <name>.npy         one plain .npy file per array (never pickled objects)
+#   <child>/           nested artifacts, e.g. an outfit builder's size model
+#
+# Numeric arrays are opened with np.load(mmap_mode='r'), so opening is
+# cheap and every process mapping the same files shares their pages.
+# The manifest is written last and marks the artifact as complete.
+#
+# The same format backs the derived-index cache: entries live under a cache
+# directory, named by a content hash of the inputs they were built from.
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+ARTIFACT_FORMAT = "fitfast-artifact"
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+
+def is_artifact(path):
+    """True when path is an artifact directory"""
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def save_artifact(path, kind, arrays, meta=None):
+    """
+    Write arrays and JSON metadata as an artifact directory
+
+    Args:
+        path: directory to write, created if missing
+        kind: what the artifact holds, checked again on load
+        arrays: {name: ndarray}, numeric, bool or fixed-width text
+        meta: JSON-serializable metadata
+    """
+    os.makedirs(path, exist_ok=True)
+
+    # An interrupted rewrite must not leave a manifest over mixed files
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.unlink(manifest_path)
+
+    entries = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise TypeError(f"Array '{name}' has object dtype, convert it with text_array()")
+
+        filename = f"{name}.npy"
+        np.save(os.path.join(path, filename), array, allow_pickle=False)
+        entries[name] = {"file": filename, "dtype": array.dtype.str, "shape": list(array.shape)}
+
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "version": ARTIFACT_FORMAT_VERSION,
+        "kind": kind,
+        "arrays": entries,
+        "meta": meta or {},
+    }
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, default=_json_default)
+    os.replace(tmp_path, manifest_path)
+
+
+def load_artifact(path, kind, mmap=True):
+    """
+    Open an artifact directory written by save_artifact()
+
+    Returns:
+        (arrays, meta); arrays are read-only views of memory maps when
+        mmap is True
+    """
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} is not a {ARTIFACT_FORMAT} directory")
+    if manifest.get("version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact version: {manifest.get('version')}")
+    if manifest.get("kind") != kind:
+        raise ValueError(f"Expected a '{kind}' artifact, found '{manifest.get('kind')}'")
+
+    arrays = {}
+    for name, entry in manifest["arrays"].items():
+        array = np.load(os.path.join(path, entry["file"]),
+                        mmap_mode="r" if mmap else None, allow_pickle=False)
+        if array.dtype.str != entry["dtype"] or list(array.shape) != entry["shape"]:
+            raise ValueError(f"Array '{name}' in {path} does not match its manifest entry")
+        # Plain ndarray view: same mapped pages, without np.memmap's per-slice overhead
+        arrays[name] = array.view(np.ndarray)
+
+    return arrays, manifest["meta"]
+
+
+def _json_default(value):
+    """NumPy scalars and arrays in metadata become plain JSON values"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def text_array(values):
+    """Fixed-width unicode array for a sequence of strings (None becomes '')"""
+    return np.asarray(["" if value is None else str(value) for value in values], dtype=str)
+
+
+def id_array(values):
+    """int64 array for integer ids, text otherwise"""
+    values = list(values)
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values):
+        return np.asarray(values, dtype=np.int64)
+    return text_array(values)
+
+
+def records_to_columns(records, prefix):
+    """
+    Split a list of flat dicts into one array per field
+
+    Returns:
+        (arrays, fields); fields keeps key order and per-field type so
+        columns_to_records() can rebuild the same dicts
+    """
+    keys = list(records[0].keys()) if records else []
+    arrays, fields = {}, []
+
+    for key in keys:
+        values = [_plain(record.get(key)) for record in records]
+        if all(isinstance(v, bool) for v in values):
+            kind, array = "bool", np.asarray(values, dtype=bool)
+        elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            kind = "int" if all(isinstance(v, int) for v in values) else "float"
+            array = np.asarray(values, dtype=np.int64 if kind == "int" else float)
+        else:
+            kind, array = "str", text_array(values)
+
+        arrays[f"{prefix}{len(fields)}"] = array
+        fields.append([key, kind])
+
+    return arrays, fields
+
+
+def columns_to_records(arrays, fields, prefix):
+    """Inverse of records_to_columns(), plain Python values"""
+    columns = [arrays[f"{prefix}{i}"].tolist() for i in range(len(fields))]
+    keys = [key for key, _ in fields]
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+# ========== TYPED LABELS AND METADATA ==========
+LABEL_KINDS = ("str", "int", "float", "bool", "none")
+
+
+def _label_kind(value):
+    if value is None:
+        return "none"
+    for kind, types in (("bool", bool), ("int", int), ("float", float), ("str", str)):
+        if isinstance(value, types):
+            return kind
+    raise TypeError(f"Unsupported label type: {type(value).__name__}")
+
+
+def label_arrays(name, values):
+    """
+    Arrays for labels such as sizes that keep each label's type
+
+    Returns (arrays, kind). All-int and all-float labels are one numeric
+    array, all-text labels one text array; anything mixed is text plus an
+    int8 kind code per label (see LABEL_KINDS). Store kind in the
+    metadata and pass it back to labels_from_arrays().
+    """
+    values = [_plain(value) for value in values]
+    kinds = {_label_kind(value) for value in values}
+
+    if kinds == {"int"}:
+        return {name: np.asarray(values, dtype=np.int64)}, "int"
+    if kinds == {"float"}:
+        return {name: np.asarray(values, dtype=float)}, "float"
+    if kinds <= {"str"}:
+        return {name: text_array(values)}, "str"
+
+    codes = np.asarray([LABEL_KINDS.index(_label_kind(value)) for value in values], dtype=np.int8)
+    return {name: text_array(values), f"{name}_kinds": codes}, "mixed"
+
+
+def labels_from_arrays(arrays, name, kind):
+    """Inverse of label_arrays(): a numeric array, or an object array of Python values"""
+    if kind in ("int", "float"):
+        return np.array(arrays[name])
+
+    labels = arrays[name].tolist()
+    if kind == "mixed":
+        parse = {"str": str, "int": int, "float": float,
+                 "bool": lambda text: text == "True", "none": lambda text: None}
+        labels = [parse[LABEL_KINDS[code]](text)
+                  for text, code in zip(labels, arrays[f"{name}_kinds"].tolist())]
+
+    result = np.empty(len(labels), dtype=object)
+    result[:] = labels
+    return result
+
+
+def encode_meta(value):
+    """
+    JSON form of nested metadata that survives a round trip unchanged
+
+    NumPy scalars become plain values. Dicts whose keys are not all strings
+    (e.g. size_stats keyed by numeric sizes) become {"__items__": [[key,
+    value], ...]}, so decode_meta() gives the keys back with their types.
+    """
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {str(key): encode_meta(item) for key, item in value.items()}
+        return {"__items__": [[encode_meta(key), encode_meta(item)] for key, item in value.items()]}
+    if isinstance(value, (list, tuple)):
+        return [encode_meta(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return [encode_meta(item) for item in value.tolist()]
+    return _plain(value)
+
+
+def decode_meta(value):
+    """Inverse of encode_meta()"""
+    if isinstance(value, dict):
+        if set(value) == {"__items__"}:
+            return {decode_meta(key): decode_meta(item) for key, item in value["__items__"]}
+        return {key: decode_meta(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_meta(item) for item in value]
+    return value
+
+
+# ========== DERIVED-INDEX CACHE ==========
+def content_hash(*parts):
+    """
+    sha256 hex digest of build inputs
+
+    Parts can be DataFrames, arrays, dicts (hashed in key order) or
+    JSON-serializable values. Equal content gives an equal hash across
+    processes and restarts.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        _update_hash(digest, part)
+    return digest.hexdigest()
+
+
+def _update_hash(digest, part):
+    if hasattr(part, "columns") and hasattr(part, "dtypes"):  # DataFrame
+        import pandas as pd
+
+        digest.update(b"frame")
+        digest.update(json.dumps([[str(c) for c in part.columns], [str(t) for t in part.dtypes]]).encode())
+        try:
+            row_hashes = pd.util.hash_pandas_object(part, index=True)
+        except TypeError:  # Unhashable cells such as lists or dicts
+            row_hashes = pd.util.hash_pandas_object(part.astype(str), index=True)
+        digest.update(row_hashes.to_numpy().tobytes())
+    elif isinstance(part, np.ndarray):
+        digest.update(f"array{part.dtype.str}{part.shape}".encode())
+        if part.dtype.hasobject:
+            digest.update(json.dumps(part.tolist(), default=str).encode())
+        else:
+            digest.update(np.ascontiguousarray(part).tobytes())
+    elif isinstance(part, dict):
+        digest.update(f"dict{len(part)}".encode())
+        for key, value in part.items():
+            _update_hash(digest, key)
+            _update_hash(digest, value)
+    else:
+        digest.update(b"value")
+        digest.update(json.dumps(part, default=str).encode())
+
+
+def cache_entry_path(cache_dir, kind, key):
+    """Directory of the cache entry for one content hash"""
+    return os.path.join(cache_dir, f"{kind}-{key[:24]}")
+
+
+def publish_artifact(path, write):
+    """
+    Run write(tmp_path), then move the result to path in one rename
+
+    Readers never see a half-written entry. When another process publishes
+    the same entry first, its copy is kept and ours is discarded. The
+    temporary directory is removed whether write() succeeds or raises.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    try:
+        write(tmp_path)
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            if not is_artifact(path):
+                raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
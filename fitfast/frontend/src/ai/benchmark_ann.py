@@ -0,0 +1,90 @@
+# benchmark_ann.py - RECALL/LATENCY OF THE IVF INDEX VS EXACT SEARCH
+#
+#   python benchmark_ann.py                       (100k and 1M items)
+#   python benchmark_ann.py --sizes 100000 --nprobe 2 8 32
+#
+# Items are synthetic clustered unit vectors split over categories, queried
+# the way find_similar_items(same_category=True) queries them.
+import argparse
+import time
+import numpy as np
+
+from ann_index import IVFIndex
+
+
+def make_catalog(n_items, dim, n_categories, rng):
+    """Clustered unit vectors with a category per row"""
+    categories = rng.integers(0, n_categories, n_items)
+    n_clusters = max(1, n_items // 500)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, n_clusters, n_items)]
+    vectors += 0.5 * rng.normal(size=(n_items, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, categories
+
+
+def exact_top_k(unit, categories, query_row, k):
+    """Reference result: full scan of the query's category"""
+    scores = unit @ unit[query_row]
+    scores[categories != categories[query_row]] = -np.inf
+    scores[query_row] = -np.inf
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def run(n_items, args, rng):
+    unit, categories = make_catalog(n_items, args.dim, args.categories, rng)
+    queries = rng.choice(n_items, args.queries, replace=False)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(unit, categories, n_lists=args.lists)
+    build_seconds = time.perf_counter() - start
+
+    exact_results, exact_times = [], []
+    for row in queries:
+        start = time.perf_counter()
+        exact_results.append(exact_top_k(unit, categories, row, args.k))
+        exact_times.append(time.perf_counter() - start)
+
+    print(f"\n{n_items:,} items, dim {args.dim}, {args.categories} categories, "
+          f"{len(index.list_categories)} lists, build {build_seconds:.1f}s")
+    print(f"  exact           p50 {percentile_ms(exact_times, 50):7.2f} ms"
+          f"  p99 {percentile_ms(exact_times, 99):7.2f} ms")
+
+    for nprobe in args.nprobe:
+        hits, times = 0, []
+        for row, expected in zip(queries, exact_results):
+            start = time.perf_counter()
+            found, _ = index.search(unit, unit[row], k=args.k + 1,
+                                    category=categories[row], nprobe=nprobe)
+            times.append(time.perf_counter() - start)
+            hits += len(set(found[found != row][:args.k]) & set(expected))
+
+        recall = hits / (len(queries) * args.k)
+        print(f"  nprobe {nprobe:<4}     p50 {percentile_ms(times, 50):7.2f} ms"
+              f"  p99 {percentile_ms(times, 99):7.2f} ms  recall@{args.k} {recall:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IVF embedding index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--dim", type=int, default=35)
+    parser.add_argument("--categories", type=int, default=9)
+    parser.add_argument("--lists", type=int, default=None, help="Lists per category")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for n_items in args.sizes:
+        run(n_items, args, rng)
+
+
+if __name__ == "__main__":
+    main()
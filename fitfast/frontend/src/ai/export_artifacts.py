@@ -0,0 +1,91 @@
+# export_artifacts.py - CONVERT MODEL PICKLES TO MEMORY-MAPPABLE ARTIFACTS
+#
+#   python export_artifacts.py            (every known pickle in artifacts/)
+#   python export_artifacts.py --check    (also compare answers with the pickle)
+#
+# Writes artifacts/size_recommender_v2/ and
+# artifacts/intelligent_outfit_builder_fixed_names/, which size_api.py and
+# outfit_api.py load in preference to the pickles. See artifact_store.py.
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+
+from ai_module import SizeRecommenderV2, IntelligentOutfitBuilder
+from artifact_store import encode_meta
+
+AI_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACTS_DIR = os.path.join(AI_DIR, "artifacts")
+
+EXPORTS = [
+    ("size_recommender_v2.pkl", SizeRecommenderV2),
+    ("intelligent_outfit_builder_fixed_names.pkl", IntelligentOutfitBuilder),
+]
+
+
+def _as_json(value):
+    return json.dumps(encode_meta(value))
+
+
+def check(model, loaded):
+    """Spot-check that the artifact answers like the pickle"""
+    if isinstance(model, IntelligentOutfitBuilder):
+        for item_id in list(model.item_metadata)[:50]:
+            if model.find_similar_items(item_id) != loaded.find_similar_items(item_id):
+                return f"find_similar_items differs for item {item_id}"
+        model, loaded = model.size_recommender, loaded.size_recommender
+        if model is None:
+            return None
+
+    measurements = {"chest_circumference": 96, "waist_circumference": 82, "hips_circumference": 98}
+    for garment_type in model.get_garment_types():
+        # Compared as JSON text: NaN equals NaN, but 30 and '30' differ
+        if _as_json(model.get_garment_stats(garment_type)) != _as_json(loaded.get_garment_stats(garment_type)):
+            return f"get_garment_stats differs for {garment_type}"
+
+        expected = model.find_best_fitting_items(measurements, garment_type, top_k=None, min_fit_score=0)
+        if expected != loaded.find_best_fitting_items(measurements, garment_type, top_k=None, min_fit_score=0):
+            return f"find_best_fitting_items differs for {garment_type}"
+
+        for recommendation in expected[:20]:
+            item_id = recommendation["item_id"]
+            if (model.recommend_size_for_item(item_id, measurements, min_fit_score=0)
+                    != loaded.recommend_size_for_item(item_id, measurements, min_fit_score=0)):
+                return f"recommend_size_for_item differs for item {item_id}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export model pickles as memory-mappable artifacts")
+    parser.add_argument("--check", action="store_true", help="Compare artifact answers with the pickle")
+    args = parser.parse_args()
+
+    failed = False
+    for filename, cls in EXPORTS:
+        source = os.path.join(ARTIFACTS_DIR, filename)
+        if not os.path.exists(source):
+            print(f"skip {filename}: not found")
+            continue
+
+        with open(source, "rb") as f:
+            model = pickle.load(f)
+
+        target = os.path.join(ARTIFACTS_DIR, os.path.splitext(filename)[0])
+        model.save_artifact(target)
+
+        start = time.perf_counter()
+        loaded = cls.load_artifact(target)
+        print(f"{filename} -> {os.path.relpath(target, AI_DIR)} (opens in {(time.perf_counter() - start) * 1000:.1f} ms)")
+
+        if args.check:
+            problem = check(model, loaded)
+            print(f"  check: {problem or 'ok'}")
+            failed = failed or problem is not None
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,15 @@ def load_outfit_model():
     ai_dir = os.path.dirname(os.path.abspath(__file__))
     artifacts_dir = os.path.join(ai_dir, "artifacts")
 
+    # Prefer the memory-mapped artifact of the fixed model (see export_artifacts.py)
+    artifact_path = os.path.join(artifacts_dir, "intelligent_outfit_builder_fixed_names")
+    if os.path.isfile(os.path.join(artifact_path, "manifest.json")):
+        try:
+            from ai_module import IntelligentOutfitBuilder
+            return IntelligentOutfitBuilder.load_artifact(artifact_path), "intelligent_outfit_builder_fixed_names"
+        except Exception as e:
+            print(f"Error loading model artifact: {e}", file=sys.stderr)
+
     # FIRST: Try the NEW fixed model
     fixed_model_path = os.path.join(artifacts_dir, "intelligent_outfit_builder_fixed_names.pkl")
     if os.path.exists(fixed_model_path):
@@ -44,7 +53,114 @@ def load_outfit_model():
 
     return None, None
 
+def handle_request(outfit_builder, model_file, request_data):
+    """Run one outfit request against an already loaded builder"""
+    try:
+        if not outfit_builder:
+            return {
+                "success": False,
+                "message": "Outfit builder not found",
+                "outfit": {}
+            }
+
+        # Build outfit
+        outfit = outfit_builder.build_outfit(
+            str(request_data["starting_item_id"]),
+            request_data.get("user_measurements", {}),
+            request_data["style_theme"],
+            max_items=request_data["max_items"]
+        )
+
+        if not outfit:
+            return {
+                "success": True,
+                "message": "No outfit built",
+                "outfit": {},
+                "model_used": model_file
+            }
+
+        # Ensure outfit is JSON serializable
+        serializable_outfit = {
+            "starting_item": {
+                "id": str(outfit.get("starting_item", {}).get("id", "")),
+                "name": str(outfit.get("starting_item", {}).get("name", "")),
+                "garment_type": str(outfit.get("starting_item", {}).get("garment_type", "")),
+                "price": float(outfit.get("starting_item", {}).get("price", 0)),
+            },
+            "outfit_items": [],
+            "total_price": float(outfit.get("total_price", 0)),
+            "item_count": int(outfit.get("item_count", 0)),
+            "compatibility_score": float(outfit.get("compatibility_score", 0)),
+            "style_coherence": float(outfit.get("style_coherence", 0)),
+            "style_theme": str(outfit.get("style_theme", "")),
+            "description": str(outfit.get("description", ""))
+        }
+
+        # Add outfit items
+        for item in outfit.get("outfit_items", []):
+            serializable_outfit["outfit_items"].append({
+                "id": str(item.get("id", "")),
+                "name": str(item.get("name", "")),
+                "garment_type": str(item.get("garment_type", "")),
+                "garment_category": str(item.get("garment_category", "")),
+                "price": float(item.get("price", 0)),
+            })
+
+        return {
+            "success": True,
+            "outfit": serializable_outfit,
+            "model_used": model_file,
+            "items_count": serializable_outfit["item_count"]
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "message": str(e),
+            "outfit": {}
+        }
+
+def _with_request_id(result, request_data):
+    """Echo the caller's id so results can be matched back to requests"""
+    if isinstance(request_data, dict) and "request_id" in request_data:
+        result["request_id"] = request_data["request_id"]
+    return result
+
+def run_batch(lines, out):
+    """Answer newline-delimited requests, writing one result line per request"""
+    model, model_file = load_outfit_model()
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_data = None
+        try:
+            request_data = json.loads(line)
+            result = handle_request(model, model_file, request_data)
+            # Inside the try: a result JSON cannot encode is that request's error
+            encoded = json.dumps(_with_request_id(result, request_data))
+        except Exception as e:
+            encoded = json.dumps(_with_request_id({
+                "success": False,
+                "message": str(e),
+                "outfit": {}
+            }, request_data))
+
+        out.write(encoded + "\n")
+        out.flush()
+
 def main():
+    # Batch mode: --batch [file], JSON lines from the file or stdin
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        if len(sys.argv) > 2 and sys.argv[2] != "-":
+            with open(sys.argv[2], "r") as f:
+                run_batch(f, sys.stdout)
+        else:
+            run_batch(sys.stdin, sys.stdout)
+        return
+
     try:
         # Load request data
         with open(sys.argv[1], "r") as f:
@@ -52,63 +168,7 @@ def main():
 
         # Load model
         outfit_builder, model_file = load_outfit_model()
-
-        if not outfit_builder:
-            result = {
-                "success": False,
-                "message": "Outfit builder not found",
-                "outfit": {}
-            }
-        else:
-            # Build outfit
-            outfit = outfit_builder.build_outfit(
-                str(request_data["starting_item_id"]),
-                request_data.get("user_measurements", {}),
-                request_data["style_theme"],
-                max_items=request_data["max_items"]
-            )
-
-            if not outfit:
-                result = {
-                    "success": True,
-                    "message": "No outfit built",
-                    "outfit": {},
-                    "model_used": model_file
-                }
-            else:
-                # Ensure outfit is JSON serializable
-                serializable_outfit = {
-                    "starting_item": {
-                        "id": str(outfit.get("starting_item", {}).get("id", "")),
-                        "name": str(outfit.get("starting_item", {}).get("name", "")),
-                        "garment_type": str(outfit.get("starting_item", {}).get("garment_type", "")),
-                        "price": float(outfit.get("starting_item", {}).get("price", 0)),
-                    },
-                    "outfit_items": [],
-                    "total_price": float(outfit.get("total_price", 0)),
-                    "item_count": int(outfit.get("item_count", 0)),
-                    "compatibility_score": float(outfit.get("compatibility_score", 0)),
-                    "style_coherence": float(outfit.get("style_coherence", 0)),
-                    "style_theme": str(outfit.get("style_theme", "")),
-                    "description": str(outfit.get("description", ""))
-                }
-
-                # Add outfit items
-                for item in outfit.get("outfit_items", []):
-                    serializable_outfit["outfit_items"].append({
-                        "id": str(item.get("id", "")),
-                        "name": str(item.get("name", "")),
-                        "garment_type": str(item.get("garment_type", "")),
-                        "garment_category": str(item.get("garment_category", "")),
-                        "price": float(item.get("price", 0)),
-                    })
-
-                result = {
-                    "success": True,
-                    "outfit": serializable_outfit,
-                    "model_used": model_file,
-                    "items_count": serializable_outfit["item_count"]
-                }
+        result = handle_request(outfit_builder, model_file, request_data)
 
     except Exception as e:
         result = {
@@ -9,6 +9,15 @@ def load_size_model():
     ai_dir = os.path.dirname(os.path.abspath(__file__))
     artifacts_dir = os.path.join(ai_dir, "artifacts")
 
+    # Prefer the memory-mapped artifact (see export_artifacts.py)
+    artifact_path = os.path.join(artifacts_dir, "size_recommender_v2")
+    if os.path.isfile(os.path.join(artifact_path, "manifest.json")):
+        try:
+            from ai_module import SizeRecommenderV2
+            return SizeRecommenderV2.load_artifact(artifact_path), "size_recommender_v2"
+        except Exception:
+            pass
+
     # Try to load size recommender
     model_path = os.path.join(artifacts_dir, "size_recommender_v2.pkl")
     if os.path.exists(model_path):
@@ -31,7 +40,96 @@ def load_size_model():
 
     return None, None
 
+def handle_request(recommender, model_file, request_data):
+    """Run one size request against an already loaded recommender"""
+    try:
+        if not recommender:
+            return {
+                "success": False,
+                "message": "AI model not found",
+                "recommendations": []
+            }
+
+        # Get recommendations
+        recommendations = recommender.find_best_fitting_items(
+            request_data["user_measurements"],
+            request_data["garment_type"],
+            top_k=request_data.get("top_k", 5),
+            min_fit_score=request_data.get("min_fit_score", 0.3)
+        )
+
+        # Ensure recommendations are JSON serializable
+        serializable_recs = []
+        for rec in recommendations:
+            serializable_recs.append({
+                "item_id": int(rec.get("item_id", 0)),
+                "item_name": str(rec.get("item_name", "")),
+                "recommended_size": str(rec.get("recommended_size", "")),
+                "overall_fit_score": float(rec.get("overall_fit_score", 0)),
+                "fit_assessment": str(rec.get("fit_assessment", "")),
+                "price": float(rec.get("price", 0)),
+                "category": str(rec.get("category", "")),
+                "store": str(rec.get("store", "")),
+                "garment_type": str(rec.get("garment_type", "")),
+                "available_sizes": list(rec.get("available_sizes", [])),
+            })
+
+        return {
+            "success": True,
+            "recommendations": serializable_recs,
+            "model_used": model_file,
+            "garment_type": request_data["garment_type"],
+            "items_found": len(serializable_recs)
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "message": str(e),
+            "recommendations": []
+        }
+
+def _with_request_id(result, request_data):
+    """Echo the caller's id so results can be matched back to requests"""
+    if isinstance(request_data, dict) and "request_id" in request_data:
+        result["request_id"] = request_data["request_id"]
+    return result
+
+def run_batch(lines, out):
+    """Answer newline-delimited requests, writing one result line per request"""
+    model, model_file = load_size_model()
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_data = None
+        try:
+            request_data = json.loads(line)
+            result = handle_request(model, model_file, request_data)
+            # Inside the try: a result JSON cannot encode is that request's error
+            encoded = json.dumps(_with_request_id(result, request_data))
+        except Exception as e:
+            encoded = json.dumps(_with_request_id({
+                "success": False,
+                "message": str(e),
+                "recommendations": []
+            }, request_data))
+
+        out.write(encoded + "\n")
+        out.flush()
+
 def main():
+    # Batch mode: --batch [file], JSON lines from the file or stdin
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        if len(sys.argv) > 2 and sys.argv[2] != "-":
+            with open(sys.argv[2], "r") as f:
+                run_batch(f, sys.stdout)
+        else:
+            run_batch(sys.stdin, sys.stdout)
+        return
+
     try:
         # Load request data
         with open(sys.argv[1], "r") as f:
@@ -39,45 +137,7 @@ def main():
 
         # Load model
         recommender, model_file = load_size_model()
-
-        if not recommender:
-            result = {
-                "success": False,
-                "message": "AI model not found",
-                "recommendations": []
-            }
-        else:
-            # Get recommendations
-            recommendations = recommender.find_best_fitting_items(
-                request_data["user_measurements"],
-                request_data["garment_type"],
-                top_k=request_data.get("top_k", 5),
-                min_fit_score=request_data.get("min_fit_score", 0.3)
-            )
-
-            # Ensure recommendations are JSON serializable
-            serializable_recs = []
-            for rec in recommendations:
-                serializable_recs.append({
-                    "item_id": int(rec.get("item_id", 0)),
-                    "item_name": str(rec.get("item_name", "")),
-                    "recommended_size": str(rec.get("recommended_size", "")),
-                    "overall_fit_score": float(rec.get("overall_fit_score", 0)),
-                    "fit_assessment": str(rec.get("fit_assessment", "")),
-                    "price": float(rec.get("price", 0)),
-                    "category": str(rec.get("category", "")),
-                    "store": str(rec.get("store", "")),
-                    "garment_type": str(rec.get("garment_type", "")),
-                    "available_sizes": list(rec.get("available_sizes", [])),
-                })
-
-            result = {
-                "success": True,
-                "recommendations": serializable_recs,
-                "model_used": model_file,
-                "garment_type": request_data["garment_type"],
-                "items_found": len(serializable_recs)
-            }
+        result = handle_request(recommender, model_file, request_data)
 
     except Exception as e:
         result = {
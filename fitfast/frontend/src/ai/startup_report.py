@@ -0,0 +1,84 @@
+# startup_report.py - WHERE COLD START TIME GOES
+#
+#   python startup_report.py            (table on stdout)
+#   python startup_report.py --json     (one JSON object)
+#
+# Times each start-up phase of the size/outfit entry points in this fresh
+# process, in the order they run: importing NumPy and ai_module, loading
+# each model the way size_api.py / outfit_api.py do, and the first request
+# against it. Also lists which heavy libraries ended up imported.
+import sys
+import time
+import json
+import argparse
+
+_PROCESS_START = time.perf_counter()
+
+SAMPLE_MEASUREMENTS = {
+    "chest_circumference": 96, "waist_circumference": 82, "hips_circumference": 98,
+    "shoulder_width": 45, "inseam_length": 80, "foot_length": 27
+}
+HEAVY_MODULES = ["pandas", "sklearn", "scipy"]
+
+
+class StartupTimer:
+    """Wall-clock milliseconds per named phase"""
+
+    def __init__(self):
+        self.phases = []
+
+    def phase(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.phases.append({"phase": name, "ms": round((time.perf_counter() - start) * 1000, 1)})
+        return result
+
+
+def run_report():
+    timer = StartupTimer()
+
+    timer.phase("import numpy", __import__, "numpy")
+    timer.phase("import ai_module", __import__, "ai_module")
+
+    import size_api
+    import outfit_api
+
+    size_model, size_file = timer.phase("load size model", size_api.load_size_model)
+    if size_model is not None:
+        timer.phase("first size request", size_model.find_best_fitting_items, SAMPLE_MEASUREMENTS, "t_shirt")
+
+    outfit_model, outfit_file = timer.phase("load outfit model", outfit_api.load_outfit_model)
+    if outfit_model is not None and outfit_model.item_metadata:
+        first_item = next(iter(outfit_model.item_metadata))
+        timer.phase("first similar-items request", outfit_model.find_similar_items, first_item)
+
+    return {
+        "phases": timer.phases,
+        "total_ms": round((time.perf_counter() - _PROCESS_START) * 1000, 1),
+        "size_model": size_file,
+        "outfit_model": outfit_file,
+        "heavy_modules_imported": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report start-up time per phase")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = run_report()
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    for entry in report["phases"]:
+        print(f"{entry['phase']:<30} {entry['ms']:>9.1f} ms")
+    print(f"{'total (since script start)':<30} {report['total_ms']:>9.1f} ms")
+    print(f"size model:   {report['size_model']}")
+    print(f"outfit model: {report['outfit_model']}")
+    print(f"heavy modules imported: {', '.join(report['heavy_modules_imported']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
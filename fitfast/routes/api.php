@@ -296,6 +296,10 @@
                 model_info["item_info_count"] = len(model.item_info)
                 model_info["item_info_sample"] = list(model.item_info.keys())[:5] if model.item_info else []
 
+        if getattr(model, 'item_catalog', None) is not None:
+            model_info["item_info_count"] = len(model.item_catalog)
+            model_info["item_info_sample"] = [str(i) for i in model.item_catalog.item_ids[:5]]
+
         if hasattr(model, 'measurement_db'):
             if hasattr(model.measurement_db, '__len__'):
                 model_info["measurement_db_count"] = len(model.measurement_db)